@@ -0,0 +1,110 @@
+"""Журнал запросов: одна JSON-строка на запрос, запись в фоновом потоке.
+
+Поток обработчика только кладёт кортеж в очередь, форматирование и запись
+в файл делает отдельный поток раз в flush_interval секунд. Если писатель
+не успевает и очередь заполнена, записи отбрасываются (и считаются), а не
+задерживают ответ клиенту.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Сколько записей может ждать записи; остальные отбрасываются.
+QUEUE_LIMIT = 100_000
+# Как часто фоновый поток сбрасывает накопленное в файл.
+FLUSH_INTERVAL = 0.2
+
+
+def format_record(record) -> str:
+    moment, client, method, path, status, sent, parse, handle, send = record
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(moment))
+    fields = {
+        "time": f"{stamp}.{int(moment % 1 * 1000):03d}",
+        "pid": os.getpid(),
+        "client": f"{client[0]}:{client[1]}",
+        "method": method,
+        "path": path,
+        "status": status,
+        "bytes": sent,
+        "parse_ms": round(parse * 1000, 3),
+        "handle_ms": round(handle * 1000, 3),
+        "send_ms": round(send * 1000, 3),
+    }
+    return json.dumps(fields, ensure_ascii=False) + "\n"
+
+
+class AccessLog:
+    """Буферизованный журнал запросов в файл path ("-" — stdout).
+
+    Создаёт поток-писатель, поэтому с pre-fork его нужно открывать уже
+    в рабочем процессе (prefork.run(on_start=...)), а не до fork.
+    """
+
+    def __init__(
+        self,
+        path: str = "-",
+        queue_limit: int = QUEUE_LIMIT,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        if path == "-":
+            self.file = sys.stdout
+        else:
+            self.file = open(path, "a", encoding="utf-8")
+        self.queue_limit = queue_limit
+        self.flush_interval = flush_interval
+        self.records = deque()
+        self.dropped = 0
+        self.write_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="access-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(
+        self,
+        client: tuple,
+        method: str,
+        path: str,
+        status: int,
+        sent: int,
+        parse: float,
+        handle: float,
+        send: float,
+    ):
+        """Добавить запись; времена — в секундах. Никогда не блокирует."""
+        if len(self.records) >= self.queue_limit:
+            self.dropped += 1
+            return
+        self.records.append(
+            (time.time(), client, method, path, status, sent, parse, handle, send)
+        )
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            lines = []
+            while self.records:
+                lines.append(format_record(self.records.popleft()))
+            if self.dropped:
+                lines.append(json.dumps({"dropped": self.dropped}) + "\n")
+                self.dropped = 0
+            if lines:
+                self.file.write("".join(lines))
+                self.file.flush()
+
+    def close(self):
+        """Дописать всё накопленное и остановить поток-писатель."""
+        if self.thread.is_alive():
+            self.stopped.set()
+            self.thread.join()
+        else:
+            self.flush()
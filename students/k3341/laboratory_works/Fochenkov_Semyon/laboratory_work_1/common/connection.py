@@ -0,0 +1,116 @@
+"""Соединение keep-alive: общий цикл обработки запросов task_3 и task_5.
+
+Сервер передаёт в handle_client свою функцию ответа respond(conn, request,
+reader, keep_alive) -> (код, байт отправлено, момент начала отправки)
+и error_response(error, keep_alive) для ошибок разбора. Цикл читает
+запросы, решает, оставлять ли соединение открытым, и пишет журнал
+запросов (open_access_log/close_access_log).
+"""
+
+import socket
+import threading
+import time
+
+from common import prefork
+from common.access_log import AccessLog
+from common.http_parser import HttpError, RequestReader
+
+# Сколько секунд ждать следующий запрос на открытом соединении.
+KEEP_ALIVE_TIMEOUT = 5
+# Сколько запросов обслужить на одном соединении, прежде чем закрыть его.
+MAX_KEEP_ALIVE_REQUESTS = 100
+
+# Журнал запросов процесса; None — не писать.
+access_log = None
+
+
+def open_access_log(path: str):
+    """Открыть журнал запросов (path "" — не писать).
+
+    С pre-fork вызывается в рабочем процессе: prefork.run(on_start=...).
+    """
+    global access_log
+    if path:
+        access_log = AccessLog(path)
+
+
+def close_access_log():
+    if access_log is not None:
+        access_log.close()
+
+
+def connection_headers(keep_alive: bool) -> bytes:
+    if keep_alive:
+        return (
+            f"Connection: keep-alive\r\nKeep-Alive: timeout={KEEP_ALIVE_TIMEOUT}\r\n"
+        ).encode("ascii")
+    return b"Connection: close\r\n"
+
+
+def handle_client(
+    conn,
+    addr,
+    respond,
+    error_response,
+    read_request=RequestReader.read_request,
+    debug: bool = True,
+):
+    """Обслуживать запросы на соединении, пока его можно держать открытым.
+
+    read_request(reader) — как прочитать очередной запрос; по умолчанию
+    целиком с телом. Если respond оставил тело непрочитанным
+    (reader.body_pending), соединение закрывается.
+    """
+    if debug:
+        print(f"[+] Подключен клиент {addr}")
+    conn.settimeout(KEEP_ALIVE_TIMEOUT)
+    reader = RequestReader(conn)
+    served = 0
+    try:
+        while True:
+            try:
+                request = read_request(reader)
+            except HttpError as e:
+                conn.sendall(error_response(e, False))
+                break
+            if request is None:
+                break
+            served += 1
+            if debug:
+                print(f"Запрос: {request.method} {request.target} {request.version}")
+            keep_alive = (
+                request.keep_alive
+                and served < MAX_KEEP_ALIVE_REQUESTS
+                and not prefork.draining.is_set()
+            )
+            started = time.perf_counter()
+            status, sent, sending = respond(conn, request, reader, keep_alive)
+            if access_log is not None:
+                access_log.log(
+                    addr,
+                    request.method,
+                    request.target,
+                    status,
+                    sent,
+                    request.parse_time,
+                    sending - started,
+                    time.perf_counter() - sending,
+                )
+            if not keep_alive or reader.body_pending:
+                break
+    except socket.timeout:
+        pass
+    except Exception as e:
+        print("Ошибка:", e)
+    finally:
+        conn.close()
+        if debug:
+            print(f"[-] Клиент {addr} отключился ({served} запр.)")
+
+
+def serve(server_socket: socket.socket, handle):
+    """Цикл accept: каждое соединение — в своём потоке handle(conn, addr)."""
+    while True:
+        conn, addr = server_socket.accept()
+        thread = threading.Thread(target=handle, args=(conn, addr), daemon=True)
+        thread.start()
@@ -0,0 +1,270 @@
+"""Инкрементальный разбор HTTP/1.x запросов из сокета.
+
+Заголовки и тело читаются ровно до своих границ: байты следующего
+запроса (keep-alive, конвейер) остаются в буфере соединения. Буферы
+создаются один раз на соединение и переиспользуются от запроса к запросу.
+"""
+
+import json
+import socket
+import time
+from urllib.parse import parse_qs, urlsplit
+
+# Сколько байт может занимать строка запроса вместе с заголовками.
+MAX_HEADER_BYTES = 16 * 1024
+# Наибольшее допустимое тело запроса.
+MAX_BODY_BYTES = 1024 * 1024
+# Сколько полей может быть в форме или строке запроса.
+MAX_FORM_FIELDS = 1000
+RECV_SIZE = 65536
+
+
+class HttpError(Exception):
+    """Запрос нельзя обработать; status и reason уходят клиенту в ответе.
+
+    detail — необязательное пояснение для тела ответа.
+    """
+
+    def __init__(self, status: int, reason: str, detail: str = ""):
+        super().__init__(f"{status} {reason}")
+        self.status = status
+        self.reason = reason
+        self.detail = detail
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: dict):
+        self.method = method
+        self.target = target
+        url = urlsplit(target)
+        self.path = url.path
+        self.query_string = url.query
+        self.version = version
+        self.headers = headers
+        self.body = b""
+        # Сколько секунд ушло на чтение и разбор с момента прихода первых байт.
+        self.parse_time = 0.0
+
+    @property
+    def keep_alive(self) -> bool:
+        """Оставить ли соединение открытым после ответа (RFC 9112, 9.3)."""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
+    @property
+    def content_type(self) -> str:
+        """Тип тела без параметров, в нижнем регистре."""
+        return self.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+    @property
+    def query(self) -> dict:
+        """Параметры строки запроса: имя -> первое значение."""
+        return parse_form(self.query_string)
+
+    def form(self) -> dict:
+        """Поля тела application/x-www-form-urlencoded: имя -> первое значение."""
+        if self.content_type != "application/x-www-form-urlencoded":
+            raise HttpError(415, "Unsupported Media Type")
+        try:
+            text = self.body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HttpError(400, "Bad Request")
+        return parse_form(text)
+
+    def json(self):
+        """Тело application/json."""
+        if self.content_type != "application/json":
+            raise HttpError(415, "Unsupported Media Type")
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, "Bad Request")
+
+    def data(self) -> dict:
+        """Поля формы или JSON-объекта — что прислал клиент.
+
+        Пустое тело — пустая форма, какой бы ни была Content-Type.
+        """
+        if not self.body:
+            return {}
+        if self.content_type == "application/json":
+            value = self.json()
+            if not isinstance(value, dict):
+                raise HttpError(400, "Bad Request")
+            return value
+        return self.form()
+
+
+def parse_form(text: str) -> dict:
+    try:
+        fields = parse_qs(
+            text,
+            keep_blank_values=True,
+            max_num_fields=MAX_FORM_FIELDS,
+        )
+    except ValueError:
+        raise HttpError(413, "Content Too Large")
+    return {name: values[0] for name, values in fields.items()}
+
+
+def parse_int(value: str):
+    """Неотрицательное целое из ASCII-цифр или None.
+
+    str.isdigit() пропускает и "²", и арабско-индийские цифры, а int()
+    на первых падает, на вторых молча соглашается — здесь только 0-9.
+    """
+    if value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+def parse_head(head: bytes) -> Request:
+    """Разобрать строку запроса и заголовки (без завершающего CRLF CRLF)."""
+    try:
+        lines = head.decode("iso-8859-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HttpError(400, "Bad Request")
+    if not version.startswith("HTTP/1."):
+        raise HttpError(505, "HTTP Version Not Supported")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep or not name or name != name.strip():
+            raise HttpError(400, "Bad Request")
+        name = name.lower()
+        value = value.strip()
+        if name in headers:
+            headers[name] += ", " + value
+        else:
+            headers[name] = value
+    return Request(method, target, version, headers)
+
+
+class RequestReader:
+    """Читает из сокета запросы один за другим (для keep-alive).
+
+    Байты, пришедшие после конца очередного запроса (конвейер), остаются
+    в буфере и становятся началом следующего. recv пишет в один и тот же
+    chunk, а буфер соединения сдвигается на разобранные байты без
+    перевыделения.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        max_header_bytes: int = MAX_HEADER_BYTES,
+        max_body_bytes: int = MAX_BODY_BYTES,
+    ):
+        self.sock = sock
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self.buffer = bytearray()
+        self.chunk = bytearray(RECV_SIZE)
+        self.chunk_view = memoryview(self.chunk)
+        # Тело последнего запроса ещё не дочитано из сокета.
+        self.body_pending = False
+
+    def fill(self) -> bool:
+        received = self.sock.recv_into(self.chunk)
+        if not received:
+            return False
+        self.buffer += self.chunk_view[:received]
+        return True
+
+    def read_request(self):
+        """Следующий запрос с телом или None, если клиент закрыл соединение."""
+        request = self.read_head()
+        if request is not None:
+            started = time.perf_counter() - request.parse_time
+            request.body = self.read_body(request)
+            request.parse_time = time.perf_counter() - started
+        return request
+
+    def read_head(self):
+        """Строка запроса и заголовки; тело остаётся в сокете.
+
+        После read_head тело нужно прочитать (read_body или iter_body),
+        иначе следующий запрос на этом соединении не разобрать: пока оно
+        не прочитано, body_pending истинно.
+        """
+        # Ожидание простаивающего keep-alive соединения в parse_time не входит.
+        started = time.perf_counter() if self.buffer else None
+        scanned = 0
+        while True:
+            end = self.buffer.find(b"\r\n\r\n", max(0, scanned - 3))
+            if end >= 0:
+                break
+            scanned = len(self.buffer)
+            if scanned > self.max_header_bytes:
+                raise HttpError(431, "Request Header Fields Too Large")
+            if not self.fill():
+                if self.buffer.strip():
+                    raise HttpError(400, "Bad Request")
+                return None
+            if started is None:
+                started = time.perf_counter()
+        if end > self.max_header_bytes:
+            raise HttpError(431, "Request Header Fields Too Large")
+        request = parse_head(bytes(self.buffer[:end]))
+        del self.buffer[: end + 4]
+        self.body_pending = True
+        request.parse_time = time.perf_counter() - started
+        return request
+
+    def body_length(self, request: Request, limit: int) -> int:
+        if "transfer-encoding" in request.headers:
+            raise HttpError(501, "Not Implemented")
+        length = parse_int(request.headers.get("content-length", "0"))
+        if length is None:
+            raise HttpError(400, "Bad Request")
+        if length > limit:
+            raise HttpError(413, "Content Too Large")
+        if length and request.headers.get("expect", "").lower() == "100-continue":
+            # Клиент ждёт разрешения, прежде чем слать тело (так делает curl).
+            self.sock.sendall(b"HTTP/1.1 100 Continue\r\n\r\n")
+        return length
+
+    def read_body(self, request: Request) -> bytes:
+        """Прочитать ровно Content-Length байт тела (не больше max_body_bytes)."""
+        length = self.body_length(request, self.max_body_bytes)
+        if len(self.buffer) >= length:
+            body = bytes(self.buffer[:length])
+            del self.buffer[:length]
+            self.body_pending = False
+            return body
+        # Большое тело принимаем сразу на место, без склейки кусков.
+        body = bytearray(length)
+        view = memoryview(body)
+        filled = len(self.buffer)
+        view[:filled] = self.buffer
+        self.buffer.clear()
+        while filled < length:
+            received = self.sock.recv_into(view[filled:])
+            if not received:
+                raise HttpError(400, "Bad Request")
+            filled += received
+        self.body_pending = False
+        return bytes(body)
+
+    def iter_body(self, request: Request, limit: int):
+        """Отдавать тело кусками по мере прихода, не держа его целиком.
+
+        Куски — memoryview на общий буфер: их надо обработать до
+        следующего шага итерации.
+        """
+        left = self.body_length(request, limit)
+        if self.buffer:
+            head = bytes(self.buffer[:left])
+            del self.buffer[:left]
+            left -= len(head)
+            yield memoryview(head)
+        while left > 0:
+            received = self.sock.recv_into(self.chunk_view[: min(left, RECV_SIZE)])
+            if not received:
+                raise HttpError(400, "Bad Request")
+            left -= received
+            yield self.chunk_view[:received]
+        self.body_pending = False
@@ -0,0 +1,197 @@
+"""Pre-fork: один порт, N рабочих процессов, перезапуск упавших.
+
+Главный процесс один раз открывает слушающий сокет (или, с reuse_port,
+каждый рабочий открывает свой с SO_REUSEPORT и ядро само делит между
+ними соединения) и порождает рабочие процессы через fork. Каждый рабочий
+крутит обычный цикл accept сервера — serve(server_socket).
+
+Упавший рабочий перезапускается. По SIGTERM или Ctrl+C главный процесс
+рассылает рабочим SIGTERM: они перестают принимать соединения, выставляют
+draining (серверы по нему закрывают keep-alive) и ждут, пока потоки
+обработчиков закончат, но не дольше drain_timeout секунд.
+
+Работает только там, где есть os.fork (Linux, macOS).
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+WORKERS = os.cpu_count() or 1
+BACKLOG = 1024
+# Сколько секунд рабочий ждёт незавершённые запросы при остановке.
+DRAIN_TIMEOUT = 10
+# Если рабочий прожил меньше этого, перед перезапуском делаем паузу,
+# чтобы падающий при старте сервер не порождал процессы в цикле.
+RESTART_DELAY = 1.0
+
+# Выставляется в рабочем процессе, когда он начал останавливаться.
+draining = threading.Event()
+
+
+class Shutdown(BaseException):
+    """Прерывает accept в рабочем процессе по SIGTERM.
+
+    Наследуется от BaseException, чтобы её не проглотил "except Exception"
+    в коде сервера.
+    """
+
+
+def make_listener(
+    host: str, port: int, backlog: int = BACKLOG, reuse_port: bool = False
+) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def shutdown_handler(signum, frame):
+    # Второй сигнал во время остановки ничего не прерывает.
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise Shutdown
+
+
+def drain(timeout: float, background: set) -> int:
+    """Дождаться потоков обработчиков, т.е. всех, кроме background.
+
+    Возвращает, сколько их так и не завершилось.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        left = [t for t in threading.enumerate() if t not in background]
+        if not left or time.monotonic() >= deadline:
+            return len(left)
+        time.sleep(0.05)
+
+
+def run_worker(
+    number: int,
+    serve,
+    sock,
+    address,
+    drain_timeout: float,
+    on_start=None,
+    on_exit=None,
+) -> int:
+    """Тело рабочего процесса; возвращает код выхода."""
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    signal.signal(signal.SIGINT, shutdown_handler)
+    if on_start is not None:
+        on_start()
+    # Главный и служебные потоки (например, писатель журнала) ждать не нужно.
+    background = set(threading.enumerate())
+    try:
+        if sock is None:
+            sock = make_listener(*address, reuse_port=True)
+        print(f"[worker {number}] pid {os.getpid()} готов")
+        serve(sock)
+    except Shutdown:
+        pass
+    finally:
+        if sock is not None:
+            sock.close()
+    draining.set()
+    left = drain(drain_timeout, background)
+    if left:
+        print(f"[worker {number}] не дождался {left} соединений")
+    if on_exit is not None:
+        on_exit()
+    return 0
+
+
+def run(
+    serve,
+    host: str,
+    port: int,
+    workers: int = WORKERS,
+    reuse_port: bool = False,
+    backlog: int = BACKLOG,
+    drain_timeout: float = DRAIN_TIMEOUT,
+    on_start=None,
+    on_exit=None,
+):
+    """Запустить workers процессов serve(server_socket) и следить за ними.
+
+    on_start() вызывается в рабочем процессе сразу после fork — там
+    создают то, что нельзя унаследовать от родителя (потоки). on_exit()
+    вызывается после того, как рабочий дождался своих запросов:
+    atexit-обработчики там не работают, так как рабочий завершается
+    через os._exit. Возвращается, когда после сигнала остановки
+    завершились все рабочие.
+    """
+    shared = None if reuse_port else make_listener(host, port, backlog)
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def spawn(number: int):
+        # Иначе недописанный буфер stdout напечатается и в дочернем процессе.
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(
+                    number,
+                    serve,
+                    shared,
+                    (host, port, backlog),
+                    drain_timeout,
+                    on_start,
+                    on_exit,
+                )
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = (number, time.monotonic())
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for number in range(workers):
+        spawn(number)
+    print(
+        f"Сервер слушает на {host}:{port}, процессов: {workers}, "
+        f"{'SO_REUSEPORT' if reuse_port else 'общий сокет'}"
+    )
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            print("\nОстановка: ждём завершения запросов...")
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + drain_timeout + 1
+        if deadline is not None and time.monotonic() > deadline:
+            for pid in children:
+                os.kill(pid, signal.SIGKILL)
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        number, started = children.pop(pid)
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        print(f"[!] Рабочий {number} (pid {pid}) завершился с кодом {code}")
+        if time.monotonic() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        spawn(number)
+
+    if shared is not None:
+        shared.close()
+    print("Сервер остановлен.")
@@ -0,0 +1,107 @@
+"""Пакетное решение: много строк (a, b, c) в одном двоичном кадре.
+
+Запрос:  b"BATCH <n>\\n" и n * 3 чисел float64 (little-endian) — a, b, c подряд.
+Ответ:   b"BATCH <n>\\n" и n * 3 чисел float64 — (число корней, x1, x2).
+
+Число корней: 0, 1, 2 или -1, если корнем подходит любое x (a = b = c = 0).
+Отсутствующие корни передаются как NaN. При a = 0 уравнение решается как
+линейное, деления на ноль нет.
+
+Если установлен NumPy, весь кадр решается векторно; иначе — построчно.
+"""
+
+import math
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HEADER = b"BATCH"
+ROW = struct.Struct("<3d")
+# Ограничение на размер одного кадра (1M строк = 24 МБ).
+MAX_BATCH_ROWS = 1_000_000
+
+NAN = float("nan")
+
+
+def quadratic_roots(a: float, b: float, c: float):
+    """(число корней, x1, x2) для ax^2 + bx + c = 0, в том числе при a = 0."""
+    if a == 0:
+        if b == 0:
+            return (-1.0 if c == 0 else 0.0), NAN, NAN
+        return 1.0, -c / b, NAN
+    # b * b, а не b**2: при переполнении даёт inf, как в NumPy, а не
+    # OverflowError. D = NaN (inf - inf) считается, как и там, "нет корней".
+    D = b * b - 4 * a * c
+    if not D >= 0:
+        return 0.0, NAN, NAN
+    if D == 0:
+        return 1.0, -b / (2 * a), NAN
+    root = math.sqrt(D)
+    return 2.0, (-b + root) / (2 * a), (-b - root) / (2 * a)
+
+
+def solve_batch_python(payload: bytes) -> bytes:
+    out = bytearray()
+    for a, b, c in ROW.iter_unpack(payload):
+        out += ROW.pack(*quadratic_roots(a, b, c))
+    return bytes(out)
+
+
+def solve_batch_numpy(payload: bytes) -> bytes:
+    rows = np.frombuffer(payload, dtype="<f8").reshape(-1, 3)
+    a, b, c = rows[:, 0], rows[:, 1], rows[:, 2]
+    result = np.full((len(rows), 3), np.nan)
+    count, x1, x2 = result[:, 0], result[:, 1], result[:, 2]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        D = b * b - 4 * a * c
+        root = np.sqrt(np.where(D > 0, D, 0.0))
+        two_a = 2 * a
+
+        quadratic = a != 0
+        count[quadratic] = np.where(D[quadratic] > 0, 2.0, 0.0)
+        count[quadratic & (D == 0)] = 1.0
+        has_roots = quadratic & (D >= 0)
+        x1[has_roots] = ((-b + root) / two_a)[has_roots]
+        x2[quadratic & (D > 0)] = ((-b - root) / two_a)[quadratic & (D > 0)]
+
+        linear = ~quadratic & (b != 0)
+        count[linear] = 1.0
+        x1[linear] = (-c / b)[linear]
+
+        degenerate = ~quadratic & (b == 0)
+        count[degenerate] = np.where(c[degenerate] == 0, -1.0, 0.0)
+
+    return result.astype("<f8", copy=False).tobytes()
+
+
+def solve_batch(payload: bytes) -> bytes:
+    if np is not None:
+        return solve_batch_numpy(payload)
+    return solve_batch_python(payload)
+
+
+def parse_header(line: bytes) -> int:
+    """Число строк из заголовка "BATCH <n>" (ValueError, если он неверен)."""
+    name, _, count = line.strip().partition(b" ")
+    rows = int(count) if count.isdigit() else -1
+    if name != HEADER or not 0 <= rows <= MAX_BATCH_ROWS:
+        raise ValueError(f"неверный заголовок пакета: {line[:40]!r}")
+    return rows
+
+
+def encode_request(rows) -> bytes:
+    """Кадр запроса для списка троек (a, b, c)."""
+    return b"%s %d\n" % (HEADER, len(rows)) + b"".join(ROW.pack(*row) for row in rows)
+
+
+def encode_response(payload: bytes) -> bytes:
+    result = solve_batch(payload)
+    return b"%s %d\n" % (HEADER, len(result) // ROW.size) + result
+
+
+def decode_rows(data: bytes):
+    return list(ROW.iter_unpack(data))
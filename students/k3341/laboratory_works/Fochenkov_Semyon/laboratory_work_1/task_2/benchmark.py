@@ -0,0 +1,178 @@
+"""Сравнение моделей выполнения server.py: запросы в секунду и задержки.
+
+Для каждой модели запускается отдельный процесс сервера, затем --clients
+потоков шлют по --requests запросов, каждый раз дожидаясь ответа.
+
+--idle открывает перед замером столько соединений, которые ничего не шлют
+(забытые вкладки, зависшие клиенты). Если их не меньше --workers, модель
+pool обслуживает остальных только после --idle-timeout сервера.
+
+    python benchmark.py --clients 50 --requests 200 --output bench.json
+    python benchmark.py --idle 32 --idle-timeout 2
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import server
+
+HOST = "127.0.0.1"
+PORT = 12400
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def wait_for_port(port: int, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"сервер не поднялся на порту {port}")
+
+
+def client_worker(port, requests, reuse, latencies, errors):
+    request = b"1 -3 2\n"
+    sock = None
+    sock_file = None
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            if sock is None:
+                sock = socket.create_connection((HOST, port))
+                sock_file = sock.makefile("rb")
+            sock.sendall(request)
+            if not sock_file.readline():
+                raise ConnectionError("сервер закрыл соединение")
+            latencies.append(time.perf_counter() - started)
+            if not reuse:
+                sock_file.close()
+                sock.close()
+                sock = None
+    except OSError:
+        errors.append(1)
+    finally:
+        if sock is not None:
+            sock_file.close()
+            sock.close()
+
+
+def open_idle(port: int, count: int):
+    return [socket.create_connection((HOST, port)) for _ in range(count)]
+
+
+def run_load(port, clients, requests, reuse):
+    latencies = []
+    errors = []
+    threads = [
+        threading.Thread(
+            target=client_worker, args=(port, requests, reuse, latencies, errors)
+        )
+        for _ in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def bench_mode(mode, port, args):
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+        "--port",
+        str(port),
+        "--mode",
+        mode,
+        "--workers",
+        str(args.workers),
+        "--queue",
+        str(args.queue),
+        "--idle-timeout",
+        str(args.idle_timeout),
+    ]
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    idle = []
+    try:
+        wait_for_port(port)
+        idle = open_idle(port, args.idle)
+        result = run_load(port, args.clients, args.requests, not args.new_connection)
+    finally:
+        for sock in idle:
+            sock.close()
+        process.terminate()
+        process.wait()
+    result["mode"] = mode
+    result["idle"] = args.idle
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк моделей сервера task_2")
+    parser.add_argument(
+        "--modes", nargs="+", choices=server.MODES, default=server.MODES
+    )
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="на одного клиента")
+    parser.add_argument(
+        "--new-connection",
+        action="store_true",
+        help="открывать новое соединение на каждый запрос",
+    )
+    parser.add_argument("--workers", type=int, default=server.POOL_WORKERS)
+    parser.add_argument("--queue", type=int, default=server.POOL_QUEUE_LIMIT)
+    parser.add_argument(
+        "--idle", type=int, default=0, help="молчащих соединений во время замера"
+    )
+    parser.add_argument("--idle-timeout", type=float, default=server.IDLE_TIMEOUT)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    results = []
+    for offset, mode in enumerate(args.modes):
+        result = bench_mode(mode, args.port + offset, args)
+        results.append(result)
+        latency = result["latency_ms"]
+        print(
+            f"{mode:8} {result['rps']:>10} req/s  "
+            f"p50 {latency['p50']:>8} мс  p99 {latency['p99']:>8} мс  "
+            f"ошибок: {result['errors']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Память записи сверх ключа и значения (их считает sys.getsizeof): кортеж
+# (значение, время) — 56 байт и float времени — 24. Узлы и хэш-таблицу
+# OrderedDict считает sys.getsizeof(self.entries): таблица не сжимается
+# после вытеснений, и при постоянной смене записей она заметно больше,
+# чем сразу после заполнения.
+ENTRY_OVERHEAD = 80
+
+
+def entry_cost(key, value: bytes) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш готовых ответов с ограничением по памяти.
+
+    Вытесняет давно не использованные записи, когда записей больше
+    max_entries или занятая кэшем память (memory()) больше max_bytes.
+    Если задан ttl, записи старше ttl секунд считаются промахом.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, created = entry
+            if self.ttl is not None and time.monotonic() - created > self.ttl:
+                self.remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: bytes):
+        cost = entry_cost(key, value)
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (value, time.monotonic())
+            self.size += cost
+            while (
+                len(self.entries) > self.max_entries or self.memory() > self.max_bytes
+            ):
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.evictions += 1
+
+    def remove(self, key):
+        value, _ = self.entries.pop(key)
+        self.size -= entry_cost(key, value)
+
+    def memory(self) -> int:
+        """Байт под записи и сам словарь; вызывается под self.lock."""
+        return self.size + sys.getsizeof(self.entries)
+
+    def stats(self) -> str:
+        with self.lock:
+            total = self.hits + self.misses
+            ratio = self.hits / total if total else 0.0
+            return (
+                f"Кэш: попаданий {self.hits}, промахов {self.misses} "
+                f"({ratio:.1%}), записей {len(self.entries)}, "
+                f"~{self.memory()} байт, вытеснено {self.evictions}"
+            )
@@ -1,22 +1,85 @@
 import socket
+import sys
+
+from batch import ROW, decode_rows, encode_request, parse_header
 
 HOST = "127.0.0.1"
 PORT = 12345
+# Сколько запросов отправлять, не дожидаясь ответов: иначе на больших файлах
+# и клиент, и сервер могут встать в sendall с заполненными буферами.
+PIPELINE_DEPTH = 1000
+
+
+def read_line(sock_file) -> str:
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("сервер закрыл соединение")
+    return line.decode().rstrip("\n")
+
+
+def solve_many(sock: socket.socket, sock_file, requests):
+    """Отправить запросы конвейером (по PIPELINE_DEPTH) и прочитать ответы по порядку."""
+    results = []
+    for start in range(0, len(requests), PIPELINE_DEPTH):
+        window = requests[start : start + PIPELINE_DEPTH]
+        sock.sendall("".join(f"{r}\n" for r in window).encode())
+        results.extend(read_line(sock_file) for _ in window)
+    return results
+
 
-print("Решение квадратного уравнения вида ax^2 + bx + c = 0")
+def solve_batch(sock: socket.socket, sock_file, rows):
+    """Решить все тройки (a, b, c) одним двоичным пакетом.
 
-while True:
-    a = input("Введите a (или q для выхода): ")
-    if a == "q":
-        break
-    b = input("Введите b: ")
-    c = input("Введите c: ")
+    Возвращает список (число корней, x1, x2), см. batch.py.
+    """
+    sock.sendall(encode_request(rows))
+    count = parse_header(sock_file.readline())
+    data = sock_file.read(count * ROW.size)
+    if len(data) != count * ROW.size:
+        raise ConnectionError("сервер закрыл соединение")
+    return decode_rows(data)
 
-    request = f"{a} {b} {c}"
 
+def interactive(sock: socket.socket, sock_file):
+    print("Решение квадратного уравнения вида ax^2 + bx + c = 0")
+
+    while True:
+        a = input("Введите a (или q для выхода): ")
+        if a == "q":
+            break
+        b = input("Введите b: ")
+        c = input("Введите c: ")
+
+        request = f"{a} {b} {c}"
+        sock.sendall((request + "\n").encode())
+        print("Результат:", read_line(sock_file))
+
+
+if __name__ == "__main__":
+    # Одно соединение на весь сеанс:
+    #   python client.py [--batch] [файл со строками "a b c"]
+    args = sys.argv[1:]
+    use_batch = "--batch" in args
+    if use_batch:
+        args.remove("--batch")
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
         client_socket.connect((HOST, PORT))
-        client_socket.sendall(request.encode())
-
-        data = client_socket.recv(1024).decode()
-        print("Результат:", data)
+        with client_socket.makefile("rb") as sock_file:
+            if args and use_batch:
+                with open(args[0], encoding="utf-8") as f:
+                    rows = [
+                        tuple(map(float, line.split())) for line in f if line.strip()
+                    ]
+                for row, result in zip(
+                    rows, solve_batch(client_socket, sock_file, rows)
+                ):
+                    print(f"{row} -> {result}")
+            elif args:
+                with open(args[0], encoding="utf-8") as f:
+                    requests = [line.strip() for line in f if line.strip()]
+                for request, result in zip(
+                    requests, solve_many(client_socket, sock_file, requests)
+                ):
+                    print(f"{request} -> {result}")
+            else:
+                interactive(client_socket, sock_file)
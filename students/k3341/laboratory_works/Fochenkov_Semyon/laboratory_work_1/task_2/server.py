@@ -1,12 +1,43 @@
+import argparse
+import asyncio
 import socket
 import threading
 import math
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import HEADER, ROW, encode_response, parse_header
+from cache import LRUCache
 
 HOST = "127.0.0.1"
 PORT = 12345
+# Сколько байт может занимать одна ещё не дочитанная строка запроса.
+MAX_LINE_LENGTH = 1024
+BACKLOG = 1024
+
+# Модель выполнения: "thread" — поток на соединение, "pool" — ограниченный
+# пул потоков с очередью, "asyncio" — цикл событий в одном потоке.
+MODES = ("thread", "pool", "asyncio")
+MODE = "pool"
+POOL_WORKERS = 32
+POOL_QUEUE_LIMIT = 64
+# Через сколько секунд без запросов закрывать соединение. В модели pool
+# соединение держит поток пула, так что без этого workers молчащих клиентов
+# останавливают обслуживание всех остальных.
+IDLE_TIMEOUT = 5.0
+
+# Кэш ответов на повторяющиеся коэффициенты; CACHE_SIZE = 0 выключает его.
+CACHE_SIZE = 100_000
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_TTL = None
+
+cache = None
 
 
 def solve_quadratic(a: float, b: float, c: float) -> str:
+    if a == 0:
+        if b == 0:
+            return "Корень — любое число" if c == 0 else "Нет корней"
+        return f"Линейное уравнение, один корень: {-c / b}"
     D = b**2 - 4 * a * c
     if D < 0:
         return "Нет действительных корней"
@@ -19,16 +50,117 @@ def solve_quadratic(a: float, b: float, c: float) -> str:
         return f"Два корня: {x1}, {x2}"
 
 
+def handle_line(line: bytes) -> bytes:
+    """Ответ на одну строку "a b c" — тоже одна строка.
+
+    Строка "STATS" возвращает счётчики кэша.
+    """
+    if line.strip() == b"STATS":
+        return ((cache.stats() if cache else "Кэш выключен") + "\n").encode()
+    try:
+        a, b, c = map(float, line.decode().split())
+    except Exception as e:
+        return f"Ошибка: {e}\n".encode()
+    # Ключ — сами байты чисел: NaN в кортеже не равен себе (каждый "nan 1 1"
+    # был бы новой записью), а 0.0 и -0.0 в кортеже равны, хотя ответы
+    # у них разные.
+    key = ROW.pack(a, b, c)
+    if cache is not None:
+        response = cache.get(key)
+        if response is not None:
+            return response
+    try:
+        response = (solve_quadratic(a, b, c) + "\n").encode()
+    except Exception as e:
+        return f"Ошибка: {e}\n".encode()
+    if cache is not None:
+        cache.put(key, response)
+    return response
+
+
+class LineTooLong(Exception):
+    pass
+
+
+class RequestParser:
+    """Разбирает поток запросов одного соединения, не зная, откуда байты.
+
+    Запросы — строки "a b c" или пакет "BATCH <n>" с n двоичными строками
+    (см. batch.py). Ответы возвращаются в том же порядке, что и запросы.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.batch_size = None
+
+    def feed(self, data: bytes) -> bytes:
+        """Добавить data и вернуть ответы на все полностью принятые запросы."""
+        buffer = self.buffer
+        buffer += data
+        responses = []
+        pos = 0
+        while True:
+            if self.batch_size is not None:
+                if len(buffer) - pos < self.batch_size:
+                    break
+                payload = bytes(buffer[pos : pos + self.batch_size])
+                pos += self.batch_size
+                self.batch_size = None
+                responses.append(encode_response(payload))
+                continue
+            newline = buffer.find(b"\n", pos)
+            if newline < 0:
+                break
+            line = bytes(buffer[pos:newline])
+            pos = newline + 1
+            if line.startswith(HEADER):
+                try:
+                    self.batch_size = parse_header(line) * ROW.size
+                except ValueError as e:
+                    responses.append(f"Ошибка: {e}\n".encode())
+            elif line.strip():
+                responses.append(handle_line(line))
+        del buffer[:pos]
+        if self.batch_size is None and len(buffer) > MAX_LINE_LENGTH:
+            raise LineTooLong(b"".join(responses))
+        return b"".join(responses)
+
+    def finish(self) -> bytes:
+        """Ответ на последнюю строку без "\\n", если клиент закрыл запись."""
+        if self.batch_size is None and self.buffer.strip():
+            return handle_line(bytes(self.buffer))
+        return b""
+
+
+TOO_LONG = "Ошибка: слишком длинная строка\n".encode()
+
+
 def handle_client(conn, addr):
+    """Обслуживать одно соединение, пока клиент его не закроет.
+
+    Клиент может прислать сразу много строк (конвейером): ответы на все
+    полностью принятые запросы уходят одним sendall в том же порядке.
+    """
     print(f"[+] Подключен клиент {addr}")
+    conn.settimeout(IDLE_TIMEOUT)
+    parser = RequestParser()
     try:
-        data = conn.recv(1024).decode()
-        if not data:
-            return
-        print(f"[{addr}] {data}")
-        a, b, c = map(float, data.split())
-        result = solve_quadratic(a, b, c)
-        conn.sendall(result.encode())
+        while True:
+            try:
+                data = conn.recv(65536)
+            except socket.timeout:
+                print(f"[-] Клиент {addr} молчит дольше {IDLE_TIMEOUT} с")
+                return
+            if not data:
+                break
+            try:
+                responses = parser.feed(data)
+            except LineTooLong as e:
+                conn.sendall(e.args[0] + TOO_LONG)
+                break
+            if responses:
+                conn.sendall(responses)
+        conn.sendall(parser.finish())
     except Exception as e:
         print(f"Ошибка с клиентом {addr}: {e}")
     finally:
@@ -36,13 +168,122 @@ def handle_client(conn, addr):
         print(f"[-] Клиент {addr} отключился")
 
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+async def handle_client_async(reader, writer):
+    """То же, что handle_client, но для модели asyncio."""
+    addr = writer.get_extra_info("peername")
+    print(f"[+] Подключен клиент {addr}")
+    parser = RequestParser()
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(reader.read(65536), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[-] Клиент {addr} молчит дольше {IDLE_TIMEOUT} с")
+                return
+            if not data:
+                break
+            try:
+                responses = parser.feed(data)
+            except LineTooLong as e:
+                writer.write(e.args[0] + TOO_LONG)
+                break
+            if responses:
+                writer.write(responses)
+                await writer.drain()
+        writer.write(parser.finish())
+        await writer.drain()
+    except Exception as e:
+        print(f"Ошибка с клиентом {addr}: {e}")
+    finally:
+        writer.close()
+        print(f"[-] Клиент {addr} отключился")
+
+
+def make_server_socket(host: str, port: int) -> socket.socket:
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind((HOST, PORT))
-    server_socket.listen()
-    print(f"Сервер слушает на {HOST}:{PORT}")
+    server_socket.bind((host, port))
+    server_socket.listen(BACKLOG)
+    return server_socket
+
 
+def serve_threads(server_socket: socket.socket):
+    """Поток на каждое соединение (без ограничений)."""
     while True:
         conn, addr = server_socket.accept()
         thread = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
         thread.start()
+
+
+def serve_pool(server_socket: socket.socket, workers: int, queue_limit: int):
+    """Пул из workers потоков и очередь не длиннее queue_limit соединений.
+
+    Когда пул и очередь заняты, сервер перестаёт вызывать accept: новые
+    клиенты ждут в очереди ядра (listen backlog), а не плодят потоки.
+    Соединение занимает поток пула, пока клиент его не закроет или не
+    промолчит IDLE_TIMEOUT секунд.
+    """
+    slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def run(conn, addr):
+        try:
+            handle_client(conn, addr)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            slots.acquire()
+            conn, addr = server_socket.accept()
+            pool.submit(run, conn, addr)
+
+
+async def serve_asyncio(server_socket: socket.socket):
+    """Все соединения в одном потоке на цикле событий asyncio."""
+    server = await asyncio.start_server(handle_client_async, sock=server_socket)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    global cache, IDLE_TIMEOUT
+    parser = argparse.ArgumentParser(description="Сервер решения квадратных уравнений")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=MODES, default=MODE)
+    parser.add_argument("--workers", type=int, default=POOL_WORKERS)
+    parser.add_argument("--queue", type=int, default=POOL_QUEUE_LIMIT)
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=IDLE_TIMEOUT,
+        help="секунд без запросов до закрытия соединения",
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=CACHE_SIZE, help="0 — без кэша"
+    )
+    parser.add_argument("--cache-bytes", type=int, default=CACHE_MAX_BYTES)
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL)
+    args = parser.parse_args()
+
+    IDLE_TIMEOUT = args.idle_timeout
+    if args.cache_size > 0:
+        cache = LRUCache(args.cache_size, args.cache_bytes, args.cache_ttl)
+
+    with make_server_socket(args.host, args.port) as server_socket:
+        print(f"Сервер слушает на {args.host}:{args.port} (модель: {args.mode})")
+        try:
+            if args.mode == "thread":
+                serve_threads(server_socket)
+            elif args.mode == "pool":
+                serve_pool(server_socket, args.workers, args.queue)
+            else:
+                asyncio.run(serve_asyncio(server_socket))
+        except KeyboardInterrupt:
+            print("\nСервер остановлен вручную.")
+            if cache is not None:
+                print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
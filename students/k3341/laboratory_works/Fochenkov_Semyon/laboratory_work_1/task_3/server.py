@@ -1,44 +1,126 @@
-import socket
-import threading
+import argparse
+import functools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import connection, prefork  # noqa: E402
+from common.connection import connection_headers  # noqa: E402
+from common.http_parser import HttpError  # noqa: E402
+from static_files import StaticFiles  # noqa: E402
 
 HOST = "127.0.0.1"
 PORT = 8080
+# Каталог, файлы из которого раздаёт сервер ("/" -> index.html).
+DOCUMENT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public")
+# Число процессов; больше одного — pre-fork (см. common/prefork.py).
+WORKERS = 1
+# Печатать ли подключения и каждый запрос (--quiet выключает).
+DEBUG = True
+# Куда писать журнал запросов: путь к файлу, "-" — stdout, "" — никуда.
+ACCESS_LOG = "-"
 
+static = StaticFiles(DOCUMENT_ROOT)
 
-def handle_client(conn, addr):
-    print(f"[+] Подключен клиент {addr}")
-    try:
-        request = conn.recv(1024).decode()
-        print("Запрос:\n", request)
 
-        try:
-            with open("index.html", "r", encoding="utf-8") as f:
-                body = f.read()
-        except FileNotFoundError:
-            body = "<h1>404 Not Found</h1>"
+def build_response(status: str, body: bytes, keep_alive: bool) -> bytes:
+    head = (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/html; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+    ).encode("utf-8")
+    return head + connection_headers(keep_alive) + b"\r\n" + body
+
+
+def error_response(error: HttpError, keep_alive: bool) -> bytes:
+    body = f"<h1>{error.status} {error.reason}</h1>".encode("utf-8")
+    return build_response(f"{error.status} {error.reason}", body, keep_alive)
 
+
+def handle_request(conn, request, reader, keep_alive: bool):
+    """Ответить на запрос; возвращает код, число байт и момент начала отправки."""
+    try:
+        if request.method not in ("GET", "HEAD"):
+            raise HttpError(405, "Method Not Allowed")
+        entry = static.lookup(request.path)
+        variant = static.negotiate(entry, request.headers.get("accept-encoding", ""))
+    except HttpError as e:
+        response = error_response(e, keep_alive)
+        sending = time.perf_counter()
+        conn.sendall(response)
+        return e.status, len(response), sending
+    if variant.is_fresh(request.headers):
         response = (
-            "HTTP/1.1 200 OK\r\n"
-            "Content-Type: text/html; charset=utf-8\r\n"
-            f"Content-Length: {len(body.encode('utf-8'))}\r\n"
-            "\r\n"
-            f"{body}"
+            variant.not_modified_headers + connection_headers(keep_alive) + b"\r\n"
         )
-        conn.sendall(response.encode("utf-8"))
-    except Exception as e:
-        print("Ошибка:", e)
-    finally:
-        conn.close()
-        print(f"[-] Клиент {addr} отключился")
-
-
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind((HOST, PORT))
-    server_socket.listen()
-    print(f"HTTP-сервер запущен: http://{HOST}:{PORT}")
-
-    while True:
-        conn, addr = server_socket.accept()
-        thread = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
-        thread.start()
+        sending = time.perf_counter()
+        conn.sendall(response)
+        return 304, len(response), sending
+    ranges = variant.requested_ranges(request.headers)
+    sending = time.perf_counter()
+    status, sent = static.send(
+        conn,
+        variant,
+        connection_headers(keep_alive),
+        request.method == "HEAD",
+        ranges,
+    )
+    return status, sent, sending
+
+
+def handle_client(conn, addr):
+    connection.handle_client(conn, addr, handle_request, error_response, debug=DEBUG)
+
+
+def serve(server_socket):
+    connection.serve(server_socket, handle_client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервер статических файлов")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="число процессов")
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="у каждого процесса свой сокет с SO_REUSEPORT",
+    )
+    parser.add_argument(
+        "--access-log",
+        default=ACCESS_LOG,
+        help='файл журнала запросов, "-" — stdout, "" — не писать',
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="не печатать каждый запрос"
+    )
+    args = parser.parse_args()
+
+    global DEBUG
+    DEBUG = not args.quiet
+
+    if args.workers > 1:
+        prefork.run(
+            serve,
+            args.host,
+            args.port,
+            args.workers,
+            args.reuse_port,
+            on_start=functools.partial(connection.open_access_log, args.access_log),
+            on_exit=connection.close_access_log,
+        )
+        return
+    connection.open_access_log(args.access_log)
+    with prefork.make_listener(args.host, args.port) as server_socket:
+        print(f"HTTP-сервер запущен: http://{args.host}:{args.port}")
+        try:
+            serve(server_socket)
+        except KeyboardInterrupt:
+            print("\nСервер остановлен вручную.")
+        finally:
+            connection.close_access_log()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,570 @@
+import hashlib
+import mimetypes
+import os
+import secrets
+import threading
+import zlib
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote
+
+from common.http_parser import HttpError, parse_int
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Файлы не больше этого размера держим в памяти уже закодированными.
+HOT_FILE_LIMIT = 64 * 1024
+# Сколько байт тел файлов держать в памяти всего.
+HOT_CACHE_BYTES = 16 * 1024 * 1024
+# Сколько версий файлов (только заголовки) помнить.
+MAX_ENTRIES = 10_000
+# Файлы меньше этого размера не сжимаем: выигрыш съедают заголовки и CPU.
+COMPRESS_MIN_SIZE = 1024
+# Файлы больше этого размера отдаём как есть, чтобы не сжимать их минутами.
+COMPRESS_MAX_SIZE = 64 * 1024 * 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Большие файлы сжимаются в фоне и быстрее: brotli 11 на десятках мегабайт
+# занял бы процессор на минуты.
+DISK_GZIP_LEVEL = 6
+DISK_BROTLI_QUALITY = 5
+# Кодировки в порядке предпочтения сервера и расширения их копий на диске.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = (
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+# Тип для файлов, которые уже сжаты (archive.tar.gz): отдаём их как есть.
+ENCODED_TYPES = {
+    "gzip": "application/gzip",
+    "br": "application/x-brotli",
+    "bzip2": "application/x-bzip2",
+    "xz": "application/x-xz",
+}
+COPY_CHUNK = 1024 * 1024
+# Больше диапазонов в одном Range не обслуживаем: отдаём файл целиком.
+MAX_RANGES = 16
+
+
+class Variant:
+    """Одно представление версии файла: как есть или сжатое.
+
+    Заголовки собираются при создании. Тело лежит либо в body, либо в
+    файле path, откуда его отправляет sendfile.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        mtime: int,
+        content_type: str,
+        etag: str,
+        body=None,
+        encoding: str = None,
+        vary: bool = False,
+    ):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_type = content_type
+        self.body = body
+        self.etag = etag
+        self.encoding = encoding
+        validators = (
+            f"ETag: {self.etag}\r\n"
+            f"Last-Modified: {formatdate(self.mtime, usegmt=True)}\r\n"
+        )
+        if vary:
+            validators += "Vary: Accept-Encoding\r\n"
+        coding = f"Content-Encoding: {encoding}\r\n" if encoding else ""
+        # Общая часть ответов 200 и 206 (кроме Content-Type и Content-Length).
+        self.entity_headers = coding + validators + "Accept-Ranges: bytes\r\n"
+        self.headers = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Length: {self.size}\r\n" + self.entity_headers
+        ).encode("ascii")
+        self.not_modified_headers = (
+            "HTTP/1.1 304 Not Modified\r\n" + validators
+        ).encode("ascii")
+
+    def is_fresh(self, headers: dict) -> bool:
+        """Есть ли у клиента эта версия (If-None-Match / If-Modified-Since)."""
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            # Для If-None-Match сравнение слабое: W/"x" совпадает с "x".
+            return "*" in tags or any(
+                tag.removeprefix("W/") == self.etag for tag in tags
+            )
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.mtime <= since
+        return False
+
+    def requested_ranges(self, headers: dict):
+        """Диапазоны из Range: None — отдать целиком, [] — ответить 416."""
+        range_header = headers.get("range")
+        if range_header is None:
+            return None
+        if_range = headers.get("if-range")
+        if if_range is not None:
+            if if_range.startswith(('"', "W/")):
+                # If-Range требует сильного совпадения ETag.
+                matches = if_range == self.etag
+            else:
+                matches = if_range == formatdate(self.mtime, usegmt=True)
+            if not matches:
+                return None
+        return parse_ranges(range_header, self.size)
+
+
+class StaticFile(Variant):
+    """Одна версия файла: заранее собранные заголовки и, если файл мал, тело.
+
+    ETag считается один раз на версию: для файлов из памяти — хэш
+    содержимого, для больших — из mtime, размера и inode (как в nginx),
+    чтобы первый запрос к многогигабайтному файлу не читал его целиком.
+    Сжатые варианты создаются при первом запросе с подходящим
+    Accept-Encoding и живут, пока жива версия.
+    """
+
+    def __init__(self, path: str, stat: os.stat_result, body, digest: str):
+        content_type, encoding = guess_type(path)
+        self.compressible = (
+            encoding is None
+            and COMPRESS_MIN_SIZE <= stat.st_size <= COMPRESS_MAX_SIZE
+            and is_compressible(content_type)
+        )
+        super().__init__(
+            path,
+            stat.st_size,
+            int(stat.st_mtime),
+            content_type,
+            f'"{digest}"',
+            body,
+            vary=self.compressible,
+        )
+        self.version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        # Кодировка -> Variant или None, если сжатие не дало выигрыша.
+        self.variants = {}
+        # Кодировки, копии которых сейчас сжимаются в фоне.
+        self.building = set()
+        self.cached_bytes = 0 if body is None else len(body)
+        self.variants_lock = threading.Lock()
+
+
+def guess_type(path: str):
+    """Content-Type файла и его кодировка (gzip для .gz и т.п.) или None.
+
+    Уже сжатый файл отдаётся как архив, без Content-Encoding: клиент
+    получает ровно те байты, что лежат на диске.
+    """
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding is not None:
+        return ENCODED_TYPES.get(encoding, "application/octet-stream"), encoding
+    if content_type is None:
+        return "application/octet-stream", None
+    if content_type.startswith("text/") or content_type in (
+        "application/javascript",
+        "application/json",
+    ):
+        return content_type + "; charset=utf-8", None
+    return content_type, None
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0]
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def accepted_encodings(accept_encoding: str) -> list:
+    """Поддерживаемые кодировки из Accept-Encoding, лучшие первыми."""
+    weights = {}
+    default = 0.0
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        weight = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name == "*":
+            default = weight
+        elif name:
+            weights[name] = weight
+    ranked = [
+        (weights.get(encoding, default), -rank, encoding)
+        for rank, encoding in enumerate(ENCODINGS)
+    ]
+    ranked.sort(reverse=True)
+    return [encoding for weight, _, encoding in ranked if weight > 0]
+
+
+def parse_ranges(range_header: str, size: int):
+    """Разобрать "bytes=0-99,-500" в список (начало, конец включительно).
+
+    None — заголовок не понят и его надо игнорировать (RFC 9110, 14.2),
+    пустой список — ни один диапазон не попадает в файл.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    items = spec.split(",")
+    if len(items) > MAX_RANGES:
+        return None
+    ranges = []
+    for item in items:
+        first, sep, last = item.strip().partition("-")
+        start = parse_int(first) if first else None
+        end = parse_int(last) if last else None
+        if (
+            not sep
+            or not (first or last)
+            or (first and start is None)
+            or (last and end is None)
+        ):
+            return None
+        if start is None:
+            # Суффикс: последние end байт файла.
+            if end > 0 and size > 0:
+                ranges.append((max(0, size - end), size - 1))
+            continue
+        if end is not None and end < start:
+            return None
+        if start < size:
+            end = size - 1 if end is None else min(end, size - 1)
+            ranges.append((start, end))
+    return ranges
+
+
+def compress_chunks(encoding: str, chunks, large: bool = False):
+    """Сжать последовательность кусков в gzip или br, выдавая куски результата.
+
+    large — уровни для больших файлов (DISK_*): быстрее, но слабее.
+    """
+    if encoding == "br":
+        quality = DISK_BROTLI_QUALITY if large else BROTLI_QUALITY
+        compressor = brotli.Compressor(quality=quality)
+        feed, finish = compressor.process, compressor.finish
+    else:
+        level = DISK_GZIP_LEVEL if large else GZIP_LEVEL
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        feed, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        yield feed(chunk)
+    yield finish()
+
+
+class StaticFiles:
+    """Раздача файлов из root с кэшем версий по mtime.
+
+    Заголовки каждой версии файла собираются один раз. Маленькие файлы
+    хранятся в памяти целиком, большие отправляются через sendfile прямо
+    из файла, без копирования в Python. Сжатые варианты маленьких файлов
+    тоже хранятся в памяти, больших — рядом с файлом (index.html.gz).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        hot_file_limit: int = HOT_FILE_LIMIT,
+        hot_cache_bytes: int = HOT_CACHE_BYTES,
+    ):
+        self.root = os.path.realpath(root)
+        self.hot_file_limit = hot_file_limit
+        self.hot_cache_bytes = hot_cache_bytes
+        self.entries = OrderedDict()
+        self.hot_bytes = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, url_path: str) -> str:
+        """Путь на диске для url_path; не даёт выйти за пределы root."""
+        relative = unquote(url_path).lstrip("/")
+        if "\0" in relative:
+            # %00 в пути: os.path и os.stat отвечают на него ValueError.
+            raise HttpError(400, "Bad Request")
+        path = os.path.realpath(os.path.join(self.root, relative))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise HttpError(403, "Forbidden")
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        return path
+
+    def lookup(self, url_path: str) -> StaticFile:
+        path = self.resolve(url_path)
+        if self.is_sidecar(path):
+            raise HttpError(404, "Not Found")
+        try:
+            stat = os.stat(path)
+        except PermissionError:
+            raise HttpError(403, "Forbidden")
+        except OSError:
+            # Нет файла, слишком длинное имя (ENAMETOOLONG), петля ссылок...
+            raise HttpError(404, "Not Found")
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(path)
+                return entry
+        entry = self.load(path, stat)
+        with self.lock:
+            self.store(entry)
+        return entry
+
+    @staticmethod
+    def is_sidecar(path: str) -> bool:
+        """Это наша сжатая копия (index.html.gz рядом с index.html)?"""
+        for suffix in SUFFIXES.values():
+            if path.endswith(suffix) and os.path.isfile(path[: -len(suffix)]):
+                return True
+        return path.endswith(".tmp") and any(
+            suffix + "." in path for suffix in SUFFIXES.values()
+        )
+
+    def load(self, path: str, stat: os.stat_result) -> StaticFile:
+        body = None
+        if stat.st_size <= self.hot_file_limit:
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except PermissionError:
+                raise HttpError(403, "Forbidden")
+            except OSError:
+                raise HttpError(404, "Not Found")
+        if body is not None and len(body) == stat.st_size:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        else:
+            # Большой файл или файл меняется прямо сейчас — отдаём его с диска.
+            body = None
+            digest = f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{stat.st_ino:x}"
+        return StaticFile(path, stat, body, digest)
+
+    def store(self, entry: StaticFile):
+        old = self.entries.pop(entry.path, None)
+        if old is not None:
+            self.hot_bytes -= old.cached_bytes
+        self.entries[entry.path] = entry
+        self.hot_bytes += entry.cached_bytes
+        self.evict()
+
+    def evict(self):
+        while self.entries and (
+            len(self.entries) > MAX_ENTRIES or self.hot_bytes > self.hot_cache_bytes
+        ):
+            _, evicted = self.entries.popitem(last=False)
+            self.hot_bytes -= evicted.cached_bytes
+
+    def negotiate(self, entry: StaticFile, accept_encoding: str) -> Variant:
+        """Вариант entry, который лучше всего подходит под Accept-Encoding."""
+        if not entry.compressible:
+            return entry
+        for encoding in accepted_encodings(accept_encoding):
+            variant = self.variant(entry, encoding)
+            if variant is not None:
+                return variant
+        return entry
+
+    def variant(self, entry: StaticFile, encoding: str):
+        """Сжатый вариант entry или None, если его нет (или он ещё готовится).
+
+        Маленький файл сжимается сразу: остальные потоки ждут результата,
+        а не сжимают его параллельно. Копию большого файла на диске
+        сжимает фоновый поток, а до её готовности файл отдаётся как есть.
+        """
+        with entry.variants_lock:
+            if encoding in entry.variants:
+                return entry.variants[encoding]
+            if entry.body is not None:
+                variant = self.compress_in_memory(entry, encoding)
+            else:
+                variant = self.find_on_disk(entry, encoding)
+                if variant is None:
+                    if encoding not in entry.building:
+                        entry.building.add(encoding)
+                        threading.Thread(
+                            target=self.build_on_disk,
+                            args=(entry, encoding),
+                            name=f"compress-{encoding}",
+                            daemon=True,
+                        ).start()
+                    return None
+            entry.variants[encoding] = variant
+        if variant is not None and variant.body is not None:
+            with self.lock:
+                entry.cached_bytes += variant.size
+                if self.entries.get(entry.path) is entry:
+                    self.hot_bytes += variant.size
+                    self.evict()
+        return variant
+
+    def compress_in_memory(self, entry: StaticFile, encoding: str):
+        body = b"".join(compress_chunks(encoding, [entry.body]))
+        if len(body) >= entry.size:
+            return None
+        return self.make_variant(entry, encoding, len(body), body=body)
+
+    def find_on_disk(self, entry: StaticFile, encoding: str):
+        """Готовая сжатая копия большого файла рядом с ним или None.
+
+        Копия годится, если её mtime совпадает с mtime версии: значит, она
+        сделана из этой версии файла (нами раньше или другим процессом).
+        """
+        path = entry.path + SUFFIXES[encoding]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime_ns != entry.version[0] or stat.st_size >= entry.size:
+            return None
+        return self.make_variant(entry, encoding, stat.st_size, path=path)
+
+    def build_on_disk(self, entry: StaticFile, encoding: str):
+        """Фоновый поток: сжать большой файл в копию с mtime его версии."""
+        path = entry.path + SUFFIXES[encoding]
+        mtime_ns = entry.version[0]
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        variant = None
+        try:
+            with open(entry.path, "rb") as src, open(temp_path, "wb") as dst:
+                chunks = iter(lambda: src.read(COPY_CHUNK), b"")
+                for chunk in compress_chunks(encoding, chunks, large=True):
+                    dst.write(chunk)
+            os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(temp_path, path)
+            variant = self.find_on_disk(entry, encoding)
+        except OSError:
+            # Каталог только для чтения или нет места — отдаём без сжатия.
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        with entry.variants_lock:
+            entry.variants[encoding] = variant
+            entry.building.discard(encoding)
+
+    def make_variant(
+        self, entry: StaticFile, encoding: str, size: int, body=None, path=None
+    ) -> Variant:
+        # У каждого представления свой ETag, иначе кэши перепутают их.
+        etag = f'{entry.etag[:-1]}-{encoding}"'
+        return Variant(
+            path or entry.path,
+            size,
+            entry.mtime,
+            entry.content_type,
+            etag,
+            body,
+            encoding,
+            vary=True,
+        )
+
+    def send(
+        self,
+        conn,
+        entry: Variant,
+        extra_headers: bytes,
+        head_only: bool,
+        ranges: list = None,
+    ):
+        """Отправить заголовки (и тело, если это не HEAD) одной версии файла.
+
+        ranges — результат entry.requested_ranges(): целиком, 206 с одним
+        или несколькими диапазонами (multipart/byteranges) или 416.
+        Возвращает код ответа и число отправленных байт.
+        """
+        if ranges is None:
+            head = entry.headers + extra_headers + b"\r\n"
+            parts = [(0, entry.size, b"")]
+            return 200, self.send_parts(conn, entry, head, parts, head_only)
+        if not ranges:
+            head = (
+                "HTTP/1.1 416 Range Not Satisfiable\r\n"
+                f"Content-Range: bytes */{entry.size}\r\n"
+                "Content-Length: 0\r\n"
+            ).encode("ascii")
+            head += extra_headers + b"\r\n"
+            conn.sendall(head)
+            return 416, len(head)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            status = (
+                "HTTP/1.1 206 Partial Content\r\n"
+                f"Content-Type: {entry.content_type}\r\n"
+                f"Content-Length: {end - start + 1}\r\n"
+                f"Content-Range: bytes {start}-{end}/{entry.size}\r\n"
+            )
+            head = (status + entry.entity_headers).encode("ascii")
+            head += extra_headers + b"\r\n"
+            parts = [(start, end - start + 1, b"")]
+            return 206, self.send_parts(conn, entry, head, parts, head_only)
+        boundary = secrets.token_hex(16)
+        parts = []
+        for start, end in ranges:
+            part_head = (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {entry.content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{entry.size}\r\n\r\n"
+            ).encode("ascii")
+            parts.append((start, end - start + 1, part_head))
+        tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+        length = sum(len(p) + n for _, n, p in parts) + len(tail)
+        status = (
+            "HTTP/1.1 206 Partial Content\r\n"
+            f"Content-Type: multipart/byteranges; boundary={boundary}\r\n"
+            f"Content-Length: {length}\r\n"
+        )
+        head = (status + entry.entity_headers).encode("ascii")
+        head += extra_headers + b"\r\n"
+        parts.append((0, 0, tail))
+        return 206, self.send_parts(conn, entry, head, parts, head_only)
+
+    def send_parts(self, conn, entry: Variant, head: bytes, parts, head_only: bool):
+        """Отправить head, затем для каждой части её заголовок и кусок тела.
+
+        parts — список (смещение, длина, заголовок части). Тело из памяти
+        уходит одним sendall, файл — через sendfile со смещением, не
+        проходя через память процесса. Возвращает число отправленных байт.
+        """
+        if head_only:
+            conn.sendall(head)
+            return len(head)
+        if entry.body is not None:
+            view = memoryview(entry.body)
+            chunks = [head]
+            for offset, count, part_head in parts:
+                chunks.append(part_head)
+                chunks.append(view[offset : offset + count])
+            data = b"".join(chunks)
+            conn.sendall(data)
+            return len(data)
+        total = len(head) + sum(len(p) + n for _, n, p in parts)
+        pending = head
+        with open(entry.path, "rb") as f:
+            for offset, count, part_head in parts:
+                pending += part_head
+                if not count:
+                    continue
+                conn.sendall(pending)
+                pending = b""
+                sent = conn.sendfile(f, offset, count)
+                if sent != count:
+                    raise ConnectionError("файл изменился во время отправки")
+        if pending:
+            conn.sendall(pending)
+        return total
@@ -0,0 +1,206 @@
+import asyncio
+
+from framing import MAX_LINE_LENGTH
+from history import HISTORY_FILE, History
+from rooms import DEFAULT_ROOM, RoomIndex, format_rooms, valid_room_name
+
+HOST = "0.0.0.0"
+PORT = 12345
+BACKLOG = 4096
+# Сколько байт может ждать отправки одному клиенту, прежде чем его отключат.
+SEND_BUFFER_LIMIT = 256 * 1024
+
+clients = {}
+rooms = RoomIndex()
+history = History(HISTORY_FILE)
+# Шина между процессами (см. sharded_server.py); None — один процесс.
+bus = None
+
+
+def send(writer: asyncio.StreamWriter, message: str):
+    """Отправить message одному клиенту, не дожидаясь сброса буфера."""
+    if writer.is_closing():
+        return
+    writer.write(message.encode("utf-8"))
+
+
+def broadcast(message: str, room=None, exclude_writer=None, remember=False):
+    """Отправить message участникам room (или всем, если room=None), кроме exclude_writer.
+
+    remember=True — это сообщение чата, его нужно сохранить в истории комнаты.
+    """
+    deliver(message, room, exclude_writer)
+    if remember:
+        history.add(room, message)
+    if bus is not None:
+        bus.publish(message, room, remember)
+
+
+def deliver(message: str, room=None, exclude_writer=None):
+    """Разослать message только клиентам этого процесса."""
+    data = message.encode("utf-8")
+    targets = clients.keys() if room is None else rooms.members_of(room)
+    for writer in list(targets):
+        if writer is exclude_writer or writer.is_closing():
+            continue
+        if writer.transport.get_write_buffer_size() > SEND_BUFFER_LIMIT:
+            print(f"[!] {clients[writer]} не успевает читать, отключаем")
+            writer.transport.abort()
+            continue
+        writer.write(data)
+
+
+async def remove_client(writer: asyncio.StreamWriter):
+    nick = clients.pop(writer, None)
+    room = rooms.leave(writer)
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+    if nick:
+        broadcast(f"[Сервер] Пользователь '{nick}' покинул чат.\n", room)
+
+
+def switch_room(writer: asyncio.StreamWriter, room: str):
+    nick = clients.get(writer)
+    if nick is None:
+        return
+    previous = rooms.join(writer, room)
+    if previous == room:
+        send(writer, f"[Сервер] Вы уже в комнате '{room}'.\n")
+        return
+    if previous is not None:
+        broadcast(
+            f"[Сервер] Пользователь '{nick}' перешёл в другую комнату.\n", previous
+        )
+    broadcast(
+        f"[Сервер] Пользователь '{nick}' вошёл в комнату.\n",
+        room,
+        exclude_writer=writer,
+    )
+    send(writer, f"[Сервер] Вы в комнате '{room}'.\n")
+    writer.write(history.replay(room))
+
+
+def handle_command(writer: asyncio.StreamWriter, text: str):
+    """Выполнить команду /join, /leave или /rooms. False — это не команда."""
+    command, _, arg = text.partition(" ")
+    if command == "/join":
+        room = arg.strip()
+        if not valid_room_name(room):
+            send(writer, "[Сервер] Использование: /join <комната>\n")
+        else:
+            switch_room(writer, room)
+    elif command == "/leave":
+        switch_room(writer, DEFAULT_ROOM)
+    elif command == "/rooms":
+        send(writer, format_rooms(rooms.rooms()))
+    else:
+        return False
+    return True
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    addr = writer.get_extra_info("peername")
+    stopping = False
+    try:
+        send(writer, "Введите ваш ник: ")
+        nick = (await reader.readline()).decode("utf-8", "replace").strip()
+        if not nick:
+            send(writer, "Неправильный ник, соединение закрывается.\n")
+            writer.close()
+            return
+
+        clients[writer] = nick
+        rooms.join(writer, DEFAULT_ROOM)
+
+        print(f"[+] {addr} -> {nick} присоединился")
+        broadcast(
+            f"[Сервер] Пользователь '{nick}' присоединился к чату.\n",
+            DEFAULT_ROOM,
+            exclude_writer=writer,
+        )
+        send(
+            writer,
+            "[Сервер] Добро пожаловать! Введите сообщения. Для выхода введите /quit\n"
+            "[Сервер] Комнаты: /join <комната>, /leave, /rooms\n",
+        )
+        writer.write(history.replay(DEFAULT_ROOM))
+
+        while True:
+            data = await reader.readline()
+            if not data:
+                break
+            text = data.decode("utf-8", "replace").rstrip("\r\n")
+            if text == "/quit":
+                break
+            if text.startswith("/") and handle_command(writer, text):
+                continue
+            room = rooms.room_of.get(writer)
+            message = f"{nick}: {text}\n"
+            print(f"[{room}] {message.strip()}")
+            broadcast(message, room, exclude_writer=writer, remember=True)
+
+    except (asyncio.LimitOverrunError, ValueError):
+        print(f"[!] {addr} прислал слишком длинную строку, отключаем")
+    except ConnectionResetError:
+        pass
+    except asyncio.CancelledError:
+        # Сервер останавливается (Ctrl+C, SIGTERM) и отменяет обработчики.
+        # Отмену не пробрасываем: иначе asyncio печатает трассировку на
+        # каждого клиента.
+        stopping = True
+    except Exception as e:
+        print("Ошибка в обработчике клиента:", e)
+    finally:
+        if stopping:
+            # Ждать клиента и рассылать прощания уже некому.
+            clients.pop(writer, None)
+            rooms.leave(writer)
+            writer.close()
+        else:
+            await remove_client(writer)
+            print(f"[-] {addr} отключился")
+
+
+def raise_fd_limit():
+    """Поднять мягкий лимит открытых файлов до жёсткого, чтобы принять 10k+ сокетов."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def main(sock=None):
+    """Запустить сервер на HOST:PORT или на уже готовом слушающем сокете sock."""
+    raise_fd_limit()
+    # В UTF-8 символ занимает до 4 байт.
+    limit = MAX_LINE_LENGTH * 4
+    if sock is None:
+        server = await asyncio.start_server(
+            handle_client,
+            HOST,
+            PORT,
+            backlog=BACKLOG,
+            reuse_address=True,
+            limit=limit,
+        )
+        print(f"Сервер чата (asyncio) запущен на {HOST}:{PORT}")
+    else:
+        server = await asyncio.start_server(handle_client, sock=sock, limit=limit)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nСервер остановлен вручную.")
@@ -0,0 +1,72 @@
+import codecs
+import socket
+
+# Максимальная длина одной строки протокола (в символах, без "\n").
+MAX_LINE_LENGTH = 4096
+RECV_SIZE = 4096
+
+
+class LineTooLong(Exception):
+    """Собеседник прислал строку длиннее MAX_LINE_LENGTH."""
+
+
+class LineDecoder:
+    """Собирает строки из произвольно нарезанного потока байт.
+
+    TCP может склеить несколько сообщений в один recv или разрезать одно
+    сообщение (и даже один многобайтовый символ UTF-8) на несколько, поэтому
+    байты декодируются инкрементально, а строкой считается всё до "\\n".
+    """
+
+    def __init__(self, max_line_length: int = MAX_LINE_LENGTH):
+        self.max_line_length = max_line_length
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pending = ""
+
+    def feed(self, data: bytes) -> list:
+        """Добавить data в буфер и вернуть все строки, которые стали полными."""
+        text = self.pending + self.decoder.decode(data)
+        lines = text.split("\n")
+        self.pending = lines.pop()
+        if len(self.pending) > self.max_line_length:
+            raise LineTooLong(len(self.pending))
+        for i, line in enumerate(lines):
+            if len(line) > self.max_line_length:
+                raise LineTooLong(len(line))
+            if line.endswith("\r"):
+                lines[i] = line[:-1]
+        return lines
+
+
+class LineReader:
+    """Построчное чтение из сокета поверх LineDecoder."""
+
+    def __init__(self, sock: socket.socket, max_line_length: int = MAX_LINE_LENGTH):
+        self.sock = sock
+        self.decoder = LineDecoder(max_line_length)
+        self.lines = []
+        self.index = 0
+
+    def readline(self):
+        """Вернуть следующую строку без "\\n" или None, если соединение закрыто."""
+        while self.index >= len(self.lines):
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                return None
+            self.lines = self.decoder.feed(data)
+            self.index = 0
+        line = self.lines[self.index]
+        self.index += 1
+        return line
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            yield line
+
+
+def encode_line(text: str) -> bytes:
+    """Закодировать одну строку протокола (перевод строки добавляется сам)."""
+    return (text.replace("\n", " ") + "\n").encode("utf-8")
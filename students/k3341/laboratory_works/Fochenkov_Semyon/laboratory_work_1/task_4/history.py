@@ -0,0 +1,180 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Сколько последних сообщений помнить в каждой комнате.
+HISTORY_SIZE = 50
+# Сколько байт истории держать в памяти на одну комнату.
+HISTORY_MAX_BYTES = 64 * 1024
+# Для скольких комнат держать историю (давно молчавшие вытесняются).
+HISTORY_MAX_ROOMS = 1000
+# Журнал на диске; None — хранить историю только в памяти.
+HISTORY_FILE = None
+# Сколько байт с конца журнала читать при запуске.
+HISTORY_TAIL_BYTES = 1024 * 1024
+# Как часто фоновый поток дописывает накопленные сообщения в журнал.
+HISTORY_FLUSH_INTERVAL = 0.2
+
+
+class RingBuffer:
+    """Последние сообщения комнаты в заранее выделенном кольцевом списке.
+
+    Старые сообщения вытесняются, когда заняты все capacity ячеек или когда
+    суммарный размер превышает max_bytes.
+    """
+
+    __slots__ = ("slots", "start", "count", "size", "max_bytes")
+
+    def __init__(
+        self, capacity: int = HISTORY_SIZE, max_bytes: int = HISTORY_MAX_BYTES
+    ):
+        self.slots = [None] * capacity
+        self.start = 0
+        self.count = 0
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def append(self, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        while self.count and (
+            self.count == len(self.slots) or self.size + len(data) > self.max_bytes
+        ):
+            self.pop_oldest()
+        index = (self.start + self.count) % len(self.slots)
+        self.slots[index] = data
+        self.count += 1
+        self.size += len(data)
+
+    def pop_oldest(self):
+        data = self.slots[self.start]
+        self.slots[self.start] = None
+        self.start = (self.start + 1) % len(self.slots)
+        self.count -= 1
+        self.size -= len(data)
+
+    def items(self):
+        capacity = len(self.slots)
+        return [self.slots[(self.start + i) % capacity] for i in range(self.count)]
+
+
+class History:
+    """История сообщений по комнатам с необязательным журналом на диске.
+
+    Журнал — текстовый файл, одна строка на сообщение: "комната\\tсообщение".
+    При запуске буферы восстанавливаются только из хвоста файла. В файл
+    пишет фоновый поток раз в flush_interval секунд, так что add не
+    блокирует цикл событий сервера на диске.
+    """
+
+    def __init__(
+        self,
+        path=HISTORY_FILE,
+        capacity: int = HISTORY_SIZE,
+        max_bytes: int = HISTORY_MAX_BYTES,
+        max_rooms: int = HISTORY_MAX_ROOMS,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+    ):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.max_rooms = max_rooms
+        self.flush_interval = flush_interval
+        self.rooms = OrderedDict()
+        self.lock = threading.Lock()
+        self.log = None
+        self.pending = deque()
+        self.write_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.writer = None
+        self.writer_pid = None
+        if path:
+            self.load(path)
+            self.log = open(path, "ab")
+            atexit.register(self.close)
+
+    def remember(self, room: str, data: bytes):
+        buffer = self.rooms.get(room)
+        if buffer is None:
+            buffer = self.rooms[room] = RingBuffer(self.capacity, self.max_bytes)
+            if len(self.rooms) > self.max_rooms:
+                self.rooms.popitem(last=False)
+        else:
+            self.rooms.move_to_end(room)
+        buffer.append(data)
+
+    def add(self, room: str, message: str, persist: bool = True):
+        """Запомнить message (строку с "\\n" на конце) в истории комнаты room.
+
+        persist=False — не писать в журнал (его уже дописал другой процесс).
+        """
+        data = message.encode("utf-8")
+        with self.lock:
+            self.remember(room, data)
+        if persist and self.log is not None:
+            self.pending.append(room.encode("utf-8") + b"\t" + data)
+            self.start_writer()
+
+    def start_writer(self):
+        # История создаётся при импорте, до fork (sharded_server.py), а потоки
+        # через fork не переходят: в каждом процессе писатель запускается свой.
+        if self.writer_pid == os.getpid():
+            return
+        with self.write_lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.writer_pid = os.getpid()
+            self.writer = threading.Thread(
+                target=self.run_writer, name="history-log", daemon=True
+            )
+            self.writer.start()
+
+    def run_writer(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            lines = []
+            while self.pending:
+                lines.append(self.pending.popleft())
+            if lines and self.log is not None:
+                self.log.write(b"".join(lines))
+                self.log.flush()
+
+    def replay(self, room: str) -> bytes:
+        """Вся сохранённая история комнаты одним блоком байт."""
+        with self.lock:
+            buffer = self.rooms.get(room)
+            return b"".join(buffer.items()) if buffer else b""
+
+    def load(self, path, tail_bytes: int = HISTORY_TAIL_BYTES):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            offset = max(0, size - tail_bytes)
+            f.seek(offset)
+            tail = f.read()
+        lines = tail.split(b"\n")
+        if offset > 0:
+            # Первая строка хвоста почти наверняка обрезана.
+            lines = lines[1:]
+        for line in lines:
+            room, sep, data = line.partition(b"\t")
+            if sep:
+                self.remember(room.decode("utf-8", "replace"), data + b"\n")
+
+    def close(self):
+        """Дописать накопленное в журнал и закрыть его."""
+        if self.writer is not None and self.writer_pid == os.getpid():
+            self.stopped.set()
+            self.writer.join()
+        self.flush()
+        with self.write_lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
@@ -0,0 +1,226 @@
+"""Нагрузочный тест чата: N имитируемых клиентов против tcp_server.py / async_server.py.
+
+Пример:
+    python load_test.py --clients 1000 --senders 50 --rate 500 --duration 30 \\
+        --server-pid 12345 --label threads --output results/threads.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+HOST = "127.0.0.1"
+PORT = 12345
+MARKER = "LT"
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.latencies = []
+        self.connect_errors = 0
+        self.disconnects = 0
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def read_rss_kb(pid):
+    """VmRSS процесса pid в килобайтах (только Linux) или None."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def connect(host, port, nick, stats, limit):
+    async with limit:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            await reader.readuntil(b": ")
+            writer.write(f"{nick}\n".encode("utf-8"))
+            await writer.drain()
+            return reader, writer
+        except (OSError, asyncio.IncompleteReadError):
+            stats.connect_errors += 1
+            return None
+
+
+async def receive(reader, stats, measuring):
+    marker = f" {MARKER} ".encode()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                stats.disconnects += 1
+                return
+            if marker not in line:
+                continue
+            now = time.perf_counter()
+            sent_at = float(line.rsplit(b" ", 2)[1])
+            if measuring.is_set():
+                stats.received += 1
+                stats.latencies.append(now - sent_at)
+    except (OSError, ValueError, IndexError):
+        stats.disconnects += 1
+
+
+async def send(writer, rate, duration, stats):
+    interval = 1 / rate
+    started = time.perf_counter()
+    next_at = started
+    seq = 0
+    while time.perf_counter() - started < duration:
+        writer.write(f"{MARKER} {time.perf_counter():.6f} {seq}\n".encode("utf-8"))
+        stats.sent += 1
+        seq += 1
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            await writer.drain()
+
+
+async def sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        rss = read_rss_kb(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args):
+    stats = Stats()
+    limit = asyncio.Semaphore(args.connect_concurrency)
+    rss_before = read_rss_kb(args.server_pid)
+
+    connect_started = time.perf_counter()
+    connections = await asyncio.gather(
+        *(
+            connect(args.host, args.port, f"load{i}", stats, limit)
+            for i in range(args.clients)
+        )
+    )
+    connections = [c for c in connections if c is not None]
+    connect_time = time.perf_counter() - connect_started
+    print(f"Подключено {len(connections)} из {args.clients} за {connect_time:.2f} с")
+
+    measuring = asyncio.Event()
+    stop = asyncio.Event()
+    rss_samples = []
+    receivers = [
+        asyncio.create_task(receive(reader, stats, measuring))
+        for reader, _ in connections
+    ]
+    sampler = asyncio.create_task(sample_rss(args.server_pid, rss_samples, stop))
+
+    # Даём серверу разослать приветствия и историю, прежде чем мерить.
+    await asyncio.sleep(args.warmup)
+    measuring.set()
+
+    senders = connections[: args.senders]
+    rate_per_sender = args.rate / max(1, len(senders))
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(send(writer, rate_per_sender, args.duration, stats) for _, writer in senders)
+    )
+    send_elapsed = time.perf_counter() - started
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+    measuring.clear()
+    stop.set()
+    await sampler
+
+    for task in receivers:
+        task.cancel()
+    for _, writer in connections:
+        writer.close()
+
+    latencies = sorted(stats.latencies)
+    return {
+        "label": args.label,
+        "server": f"{args.host}:{args.port}",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "clients": args.clients,
+        "connected": len(connections),
+        "connect_errors": stats.connect_errors,
+        "connect_seconds": round(connect_time, 3),
+        "senders": len(senders),
+        "target_rate": args.rate,
+        "duration": args.duration,
+        "sent": stats.sent,
+        "delivered": stats.received,
+        "disconnects": stats.disconnects,
+        "sent_per_second": round(stats.sent / send_elapsed, 1),
+        "delivered_per_second": round(stats.received / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "server_rss_kb": {
+            "before": rss_before,
+            "peak": max(rss_samples) if rss_samples else None,
+            "after": read_rss_kb(args.server_pid),
+        },
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера чата")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--clients", type=int, default=100, help="число клиентов")
+    parser.add_argument(
+        "--senders", type=int, default=10, help="сколько клиентов пишут сообщения"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=100,
+        help="сообщений в секунду от всех отправителей",
+    )
+    parser.add_argument("--duration", type=float, default=10, help="секунд отправки")
+    parser.add_argument("--warmup", type=float, default=1, help="пауза перед замером")
+    parser.add_argument(
+        "--drain", type=float, default=1, help="ожидание доставки после отправки"
+    )
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--server-pid", type=int, help="PID сервера для замера RSS")
+    parser.add_argument("--label", default="", help="метка прогона в отчёте")
+    parser.add_argument("--output", help="куда записать результат в JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(run(args))
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
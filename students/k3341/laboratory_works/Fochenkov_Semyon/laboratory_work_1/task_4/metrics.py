@@ -0,0 +1,146 @@
+"""Счётчики и гистограммы сервера в текстовом формате Prometheus.
+
+Запись метрики — это захват неконкурентной блокировки и пара сложений,
+поэтому её можно не выключать под нагрузкой. Скорость (сообщений в секунду)
+считает сборщик как разницу счётчиков между двумя опросами.
+"""
+
+import bisect
+import socket
+import threading
+import time
+
+
+class Counter:
+    """Монотонный счётчик, при необходимости с одной меткой."""
+
+    def __init__(self, name: str, help_text: str, label: str = None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: int = 1, label_value: str = ""):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self, kind: str = "counter"):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {kind}"]
+        with self.lock:
+            values = sorted(self.values.items())
+        if not values and self.label is None:
+            values = [("", 0)]
+        for label_value, value in values:
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может и расти, и уменьшаться."""
+
+    def dec(self, amount: int = 1, label_value: str = ""):
+        self.inc(-amount, label_value)
+
+    def set(self, value, label_value: str = ""):
+        with self.lock:
+            self.values[label_value] = value
+
+    def render(self, kind: str = "gauge"):
+        return super().render(kind)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин."""
+
+    def __init__(self, name: str, help_text: str, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.total, self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.started = time.monotonic()
+
+    def counter(self, name: str, help_text: str, label: str = None) -> Counter:
+        return self.add(Counter(name, help_text, label))
+
+    def gauge(self, name: str, help_text: str, label: str = None) -> Gauge:
+        return self.add(Gauge(name, help_text, label))
+
+    def histogram(self, name: str, help_text: str, buckets) -> Histogram:
+        return self.add(Histogram(name, help_text, buckets))
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        uptime = time.monotonic() - self.started
+        lines = [
+            "# HELP uptime_seconds Время работы сервера",
+            "# TYPE uptime_seconds gauge",
+            f"uptime_seconds {uptime:.3f}",
+        ]
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def serve_admin(registry: Registry, host: str, port: int):
+    """Отдавать registry.render() по HTTP на host:port (в отдельном потоке)."""
+
+    def loop(server_sock: socket.socket):
+        while True:
+            conn, _ = server_sock.accept()
+            with conn:
+                try:
+                    conn.settimeout(2)
+                    conn.recv(1024)
+                    body = registry.render().encode("utf-8")
+                    conn.sendall(
+                        b"HTTP/1.1 200 OK\r\n"
+                        b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                        + f"Content-Length: {len(body)}\r\n".encode()
+                        + b"Connection: close\r\n\r\n"
+                        + body
+                    )
+                except OSError:
+                    pass
+
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_sock.bind((host, port))
+    server_sock.listen()
+    threading.Thread(target=loop, args=(server_sock,), daemon=True).start()
+    return server_sock
@@ -0,0 +1,48 @@
+DEFAULT_ROOM = "general"
+MAX_ROOM_NAME = 32
+
+
+class RoomIndex:
+    """Индекс «комната -> участники» и обратный «участник -> комната».
+
+    Рассылка в комнату обходит только её участников, а не всех клиентов.
+    Класс не потокобезопасен: сервер вызывает его под своей блокировкой.
+    """
+
+    def __init__(self):
+        self.members = {}
+        self.room_of = {}
+
+    def join(self, member, room: str = DEFAULT_ROOM):
+        """Перевести member в room. Возвращает прежнюю комнату или None."""
+        previous = self.leave(member)
+        self.members.setdefault(room, set()).add(member)
+        self.room_of[member] = room
+        return previous
+
+    def leave(self, member):
+        """Убрать member из его комнаты. Возвращает эту комнату или None."""
+        room = self.room_of.pop(member, None)
+        if room is None:
+            return None
+        members = self.members[room]
+        members.discard(member)
+        if not members:
+            del self.members[room]
+        return room
+
+    def members_of(self, room: str):
+        return self.members.get(room, ())
+
+    def rooms(self):
+        """Список (комната, число участников), отсортированный по имени."""
+        return sorted((room, len(members)) for room, members in self.members.items())
+
+
+def valid_room_name(name: str) -> bool:
+    return 0 < len(name) <= MAX_ROOM_NAME and not any(ch.isspace() for ch in name)
+
+
+def format_rooms(rooms) -> str:
+    listing = ", ".join(f"{room} ({count})" for room, count in rooms)
+    return f"[Сервер] Комнаты: {listing or 'нет'}\n"
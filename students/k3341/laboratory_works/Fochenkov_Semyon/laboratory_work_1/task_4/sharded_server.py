@@ -0,0 +1,200 @@
+"""Многопроцессный чат: K процессов async_server.py на одном порту.
+
+Каждый рабочий процесс принимает соединения сам (SO_REUSEPORT, а где его нет —
+общий слушающий сокет, унаследованный через fork) и обслуживает своих клиентов.
+Чтобы пользователи разных процессов видели друг друга, рассылки идут через
+локальную шину: главный процесс слушает Unix-сокет и пересылает каждую строку
+от одного рабочего всем остальным.
+
+Ограничение: /rooms показывает только комнаты своего процесса.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+
+import async_server
+from framing import MAX_LINE_LENGTH
+
+WORKERS = os.cpu_count() or 1
+BUS_PATH = os.path.join(tempfile.gettempdir(), f"chat-bus-{os.getpid()}.sock")
+# Сколько секунд ждать остановки процессов после SIGTERM.
+STOP_TIMEOUT = 5
+
+
+def encode_frame(message: str, room, remember: bool) -> bytes:
+    """Кадр шины: "комната\\tфлаг\\tсообщение\\n" (пустая комната — всем)."""
+    return f"{room or ''}\t{int(remember)}\t{message}".encode("utf-8")
+
+
+def decode_frame(line: bytes):
+    room, remember, message = line.decode("utf-8", "replace").split("\t", 2)
+    return message, room or None, remember == "1"
+
+
+class Bus:
+    """Подключение рабочего процесса к шине."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def publish(self, message: str, room, remember: bool):
+        self.writer.write(encode_frame(message, room, remember))
+
+
+def stop_on_sigterm():
+    """По SIGTERM отменить текущую задачу, как asyncio.run отменяет по Ctrl+C."""
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+
+
+async def bus_hub(path: str, ready):
+    """Главный процесс: пересылает кадры от каждого рабочего всем остальным."""
+    stop_on_sigterm()
+    workers = set()
+
+    async def relay(reader, writer):
+        workers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for other in workers:
+                    if other is not writer and not other.is_closing():
+                        other.write(line)
+        except asyncio.CancelledError:
+            # Шину останавливают: соединение просто закрывается.
+            pass
+        finally:
+            workers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_unix_server(
+        relay, path=path, limit=MAX_LINE_LENGTH * 8
+    )
+    ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+async def bus_listener(reader: asyncio.StreamReader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            print("[!] Шина закрыта, сообщения других процессов больше не приходят")
+            return
+        message, room, remember = decode_frame(line)
+        async_server.deliver(message, room)
+        if remember:
+            async_server.history.add(room, message, persist=False)
+
+
+def make_listener(reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((async_server.HOST, async_server.PORT))
+    sock.listen(async_server.BACKLOG)
+    return sock
+
+
+async def worker_main(number: int, sock, bus_path: str):
+    reader, writer = await asyncio.open_unix_connection(
+        bus_path, limit=MAX_LINE_LENGTH * 8
+    )
+    async_server.bus = Bus(writer)
+    stop_on_sigterm()
+    listener = asyncio.create_task(bus_listener(reader))
+    print(f"[worker {number}] pid {os.getpid()} готов")
+    try:
+        await async_server.main(sock)
+    finally:
+        listener.cancel()
+
+
+def run_worker(number: int, sock, bus_path: str):
+    if sock is None:
+        sock = make_listener(reuse_port=True)
+    try:
+        asyncio.run(worker_main(number, sock, bus_path))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        # multiprocessing завершает процесс без atexit-обработчиков.
+        async_server.history.close()
+
+
+def run_hub(bus_path: str, ready):
+    try:
+        asyncio.run(bus_hub(bus_path, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+def shutdown_handler(signum, frame):
+    # SIGTERM (timeout, systemd, docker stop) завершает так же, как Ctrl+C.
+    raise KeyboardInterrupt
+
+
+def stop_processes(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+
+
+def main(workers: int = WORKERS):
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    # Без SO_REUSEPORT все процессы принимают соединения с одного сокета.
+    shared = None if reuse_port else make_listener(reuse_port=False)
+
+    ready = multiprocessing.Event()
+    hub = multiprocessing.Process(target=run_hub, args=(BUS_PATH, ready), daemon=True)
+    hub.start()
+    ready.wait()
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker, args=(i, shared, BUS_PATH), daemon=True
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(
+        f"Сервер чата запущен на {async_server.HOST}:{async_server.PORT}, "
+        f"процессов: {workers}, "
+        f"{'SO_REUSEPORT' if reuse_port else 'общий сокет'}"
+    )
+    # Только после запуска процессов, чтобы они не унаследовали обработчик.
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    try:
+        for process in processes:
+            process.join()
+            print(f"[!] Процесс {process.pid} завершился с кодом {process.exitcode}")
+    except KeyboardInterrupt:
+        print("\nСервер остановлен.")
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        # Сначала рабочие, потом шина: рабочие не должны терять её посреди
+        # остановки.
+        stop_processes(processes)
+        stop_processes([hub])
+        try:
+            os.unlink(BUS_PATH)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Многопроцессный сервер чата")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="число процессов")
+    main(parser.parse_args().workers)
@@ -2,18 +2,17 @@ import socket
 import threading
 import sys
 
+from framing import LineReader, encode_line
+
 HOST = "127.0.0.1"
 PORT = 12345
 
 
 def receive_loop(sock: socket.socket):
     try:
-        while True:
-            data = sock.recv(4096)
-            if not data:
-                print("Соединение с сервером разорвано.")
-                break
-            print(data.decode("utf-8"), end="")
+        for line in LineReader(sock):
+            print(line)
+        print("Соединение с сервером разорвано.")
     except Exception:
         pass
     finally:
@@ -35,7 +34,7 @@ if __name__ == "__main__":
         initial = sock.recv(1024).decode("utf-8")
         print(initial, end="")
         nick = input().strip()
-        sock.sendall((nick + "\n").encode("utf-8"))
+        sock.sendall(encode_line(nick))
 
         recv_thread = threading.Thread(target=receive_loop, args=(sock,), daemon=True)
         recv_thread.start()
@@ -44,15 +43,15 @@ if __name__ == "__main__":
             while True:
                 msg = input()
                 if msg.strip() == "/quit":
-                    sock.sendall("/quit\n".encode("utf-8"))
+                    sock.sendall(encode_line("/quit"))
                     break
                 try:
-                    sock.sendall((msg + "\n").encode("utf-8"))
+                    sock.sendall(encode_line(msg))
                 except Exception:
                     print("Ошибка отправки — соединение потеряно.")
                     break
         except KeyboardInterrupt:
-            sock.sendall("/quit\n".encode("utf-8"))
+            sock.sendall(encode_line("/quit"))
         finally:
             try:
                 sock.close()
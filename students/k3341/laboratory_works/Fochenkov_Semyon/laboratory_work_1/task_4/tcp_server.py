@@ -1,75 +1,334 @@
+import queue
 import socket
 import threading
+import time
+
+from framing import LineReader, LineTooLong
+from history import HISTORY_FILE, History
+from metrics import Registry, serve_admin
+from rooms import DEFAULT_ROOM, RoomIndex, format_rooms, valid_room_name
 
 HOST = "0.0.0.0"
 PORT = 12345
 
+# Сколько сообщений может ждать отправки одному клиенту.
+SEND_QUEUE_LIMIT = 256
+# Что делать с клиентом, чья очередь переполнена: "disconnect" или "drop".
+SLOW_CLIENT_POLICY = "disconnect"
+# Склеивать исходящие сообщения клиента в одну запись sendmsg.
+COALESCE_WRITES = True
+# Сколько ждать новых сообщений перед отправкой пачки (секунды).
+COALESCE_WINDOW = 0.002
+# Отправить пачку сразу, если она достигла этого размера в байтах ...
+COALESCE_MAX_BYTES = 64 * 1024
+# ... или этого числа сообщений (не больше IOV_MAX).
+COALESCE_MAX_MESSAGES = 512
+# Порт, на котором метрики отдаются по HTTP; None — только команда /stats.
+ADMIN_HOST = "127.0.0.1"
+ADMIN_PORT = 9100
+
 clients = {}
+rooms = RoomIndex()
+history = History(HISTORY_FILE)
 clients_lock = threading.Lock()
+fanout_queue = queue.SimpleQueue()
 
 
-def broadcast(message: str, exclude_sock=None):
-    """Отправить message всем клиентам (кроме exclude_sock)."""
-    with clients_lock:
-        for sock in list(clients.keys()):
-            if sock is exclude_sock:
-                continue
+stats = Registry()
+clients_connected = stats.gauge("chat_clients_connected", "Подключённые пользователи")
+messages_in = stats.counter("chat_messages_in_total", "Принятые сообщения чата")
+messages_out = stats.counter(
+    "chat_messages_out_total", "Отправленные клиентам сообщения"
+)
+messages_dropped = stats.counter(
+    "chat_messages_dropped_total", "Сообщения, выброшенные из переполненных очередей"
+)
+write_syscalls = stats.counter("chat_write_syscalls_total", "Вызовы sendmsg/sendall")
+messages_per_write = stats.histogram(
+    "chat_messages_per_write",
+    "Сколько сообщений ушло за один вызов записи",
+    [1, 2, 4, 8, 16, 32, 64, 128, 256, 512],
+)
+broadcast_seconds = stats.histogram(
+    "chat_broadcast_seconds",
+    "Время раскладки одного сообщения по очередям получателей",
+    [0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5],
+)
+send_queue_depth = stats.histogram(
+    "chat_send_queue_depth",
+    "Длина очереди клиента в момент отправки",
+    [0, 1, 4, 16, 64, 128, SEND_QUEUE_LIMIT],
+)
+disconnects = stats.counter(
+    "chat_disconnects_total", "Отключения клиентов по причинам", label="reason"
+)
+
+
+def record_write(messages: int, syscalls: int):
+    messages_out.inc(messages)
+    write_syscalls.inc(syscalls)
+    messages_per_write.observe(messages)
+
+
+def write_summary() -> str:
+    if not messages_per_write.count:
+        return "Записей в сокеты не было."
+    sent = messages_per_write.total
+    calls = write_syscalls.values.get("", 0)
+    return (
+        f"Сообщений: {sent}, системных вызовов: {calls}, "
+        f"в среднем {sent / max(1, calls):.2f} сообщ./вызов"
+    )
+
+
+def send_buffers(sock: socket.socket, buffers: list) -> int:
+    """Отправить buffers векторной записью целиком. Возвращает число вызовов."""
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(buffers))
+        return 1
+    syscalls = 0
+    first = 0
+    while first < len(buffers):
+        sent = sock.sendmsg(buffers[first : first + COALESCE_MAX_MESSAGES])
+        syscalls += 1
+        while first < len(buffers) and sent >= len(buffers[first]):
+            sent -= len(buffers[first])
+            first += 1
+        if sent:
+            buffers[first] = memoryview(buffers[first])[sent:]
+    return syscalls
+
+
+class Client:
+    """Подключённый пользователь со своей очередью исходящих сообщений."""
+
+    def __init__(self, sock: socket.socket, nick: str):
+        self.sock = sock
+        self.nick = nick
+        self.queue = queue.Queue(maxsize=SEND_QUEUE_LIMIT)
+        self.dropped = 0
+        self.closed = False
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+
+    def send(self, message: str):
+        self.enqueue(message.encode("utf-8"))
+
+    def enqueue(self, data: bytes) -> bool:
+        """Положить data в очередь, не блокируясь. False — очередь переполнена."""
+        if self.closed or not data:
+            return True
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            messages_dropped.inc()
+            return False
+
+    def next_batch(self, first: bytes):
+        """Собрать пачку, начиная с first. Второе значение — пришёл ли сигнал закрытия."""
+        batch = [first]
+        size = len(first)
+        deadline = time.monotonic() + COALESCE_WINDOW
+        while size < COALESCE_MAX_BYTES and len(batch) < COALESCE_MAX_MESSAGES:
             try:
-                sock.sendall(message.encode("utf-8"))
-            except Exception:
-                remove_client(sock)
+                data = self.queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    data = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if data is None:
+                return batch, True
+            batch.append(data)
+            size += len(data)
+        return batch, False
+
+    def write_loop(self):
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    break
+                send_queue_depth.observe(self.queue.qsize())
+                if not COALESCE_WRITES:
+                    self.sock.sendall(data)
+                    record_write(1, 1)
+                    continue
+                batch, closing = self.next_batch(data)
+                record_write(len(batch), send_buffers(self.sock, batch))
+                if closing:
+                    break
+        except OSError:
+            pass
+        finally:
+            remove_client(self.sock, "write_error")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
 
+def broadcast(message: str, room=None, exclude_sock=None):
+    """Отправить message участникам room (или всем, если room=None), кроме exclude_sock.
 
-def remove_client(sock):
+    Не дожидается отправки: сообщение лишь кладётся в fanout_queue.
+    """
+    fanout_queue.put((message.encode("utf-8"), room, exclude_sock))
+
+
+def fanout_loop():
+    """Раскладывает сообщения из fanout_queue по очередям клиентов."""
+    while True:
+        data, room, exclude_sock = fanout_queue.get()
+        started = time.perf_counter()
+        with clients_lock:
+            if room is None:
+                targets = [c for s, c in clients.items() if s is not exclude_sock]
+            else:
+                targets = [
+                    clients[s] for s in rooms.members_of(room) if s is not exclude_sock
+                ]
+        for client in targets:
+            if not client.enqueue(data) and SLOW_CLIENT_POLICY == "disconnect":
+                print(f"[!] {client.nick} не успевает читать, отключаем")
+                remove_client(client.sock, "slow")
+        broadcast_seconds.observe(time.perf_counter() - started)
+
+
+def remove_client(sock, reason: str = "eof"):
     with clients_lock:
-        nick = clients.pop(sock, None)
-    try:
-        sock.close()
-    except Exception:
-        pass
-    if nick:
-        broadcast(f"[Сервер] Пользователь '{nick}' покинул чат.\n")
+        client = clients.pop(sock, None)
+        room = rooms.leave(sock)
+    if client is None:
+        try:
+            sock.close()
+        except Exception:
+            pass
+        return
+    clients_connected.dec()
+    disconnects.inc(label_value=reason)
+    client.close()
+    broadcast(f"[Сервер] Пользователь '{client.nick}' покинул чат.\n", room)
+
+
+def switch_room(client: Client, room: str):
+    with clients_lock:
+        if client.sock not in clients:
+            return
+        previous = rooms.join(client.sock, room)
+    if previous == room:
+        client.send(f"[Сервер] Вы уже в комнате '{room}'.\n")
+        return
+    if previous is not None:
+        broadcast(
+            f"[Сервер] Пользователь '{client.nick}' перешёл в другую комнату.\n",
+            previous,
+        )
+    broadcast(
+        f"[Сервер] Пользователь '{client.nick}' вошёл в комнату.\n",
+        room,
+        exclude_sock=client.sock,
+    )
+    client.send(f"[Сервер] Вы в комнате '{room}'.\n")
+    client.enqueue(history.replay(room))
+
+
+def handle_command(client: Client, text: str):
+    """Выполнить команду /join, /leave, /rooms или /stats. False — это не команда."""
+    command, _, arg = text.partition(" ")
+    if command == "/join":
+        room = arg.strip()
+        if not valid_room_name(room):
+            client.send("[Сервер] Использование: /join <комната>\n")
+        else:
+            switch_room(client, room)
+    elif command == "/leave":
+        switch_room(client, DEFAULT_ROOM)
+    elif command == "/rooms":
+        with clients_lock:
+            listing = rooms.rooms()
+        client.send(format_rooms(listing))
+    elif command == "/stats":
+        client.send(stats.render())
+    else:
+        return False
+    return True
 
 
 def handle_client(conn: socket.socket, addr):
+    reader = LineReader(conn)
+    reason = "eof"
     try:
         conn.sendall("Введите ваш ник: ".encode("utf-8"))
-        nick = conn.recv(1024).decode("utf-8").strip()
+        nick = (reader.readline() or "").strip()
         if not nick:
             conn.sendall("Неправильный ник, соединение закрывается.\n".encode("utf-8"))
             conn.close()
+            disconnects.inc(label_value="bad_nick")
             return
 
+        client = Client(conn, nick)
         with clients_lock:
-            clients[conn] = nick
+            clients[conn] = client
+            rooms.join(conn, DEFAULT_ROOM)
+        clients_connected.inc()
+        client.writer.start()
 
         print(f"[+] {addr} -> {nick} присоединился")
         broadcast(
-            f"[Сервер] Пользователь '{nick}' присоединился к чату.\n", exclude_sock=conn
+            f"[Сервер] Пользователь '{nick}' присоединился к чату.\n",
+            DEFAULT_ROOM,
+            exclude_sock=conn,
         )
-        conn.sendall(
-            "[Сервер] Добро пожаловать! Введите сообщения. Для выхода введите /quit\n".encode(
-                "utf-8"
-            )
+        client.send(
+            "[Сервер] Добро пожаловать! Введите сообщения. Для выхода введите /quit\n"
+            "[Сервер] Комнаты: /join <комната>, /leave, /rooms; статистика: /stats\n"
         )
+        client.enqueue(history.replay(DEFAULT_ROOM))
 
-        while True:
-            data = conn.recv(4096)
-            if not data:
-                break
-            text = data.decode("utf-8").rstrip("\n")
+        for text in reader:
             if text == "/quit":
+                reason = "quit"
                 break
+            if text.startswith("/") and handle_command(client, text):
+                continue
+            messages_in.inc()
+            with clients_lock:
+                room = rooms.room_of.get(conn)
             message = f"{nick}: {text}\n"
-            print(message.strip())
-            broadcast(message, exclude_sock=conn)
+            print(f"[{room}] {message.strip()}")
+            broadcast(message, room, exclude_sock=conn)
+            history.add(room, message)
 
+    except LineTooLong:
+        reason = "line_too_long"
+        print(f"[!] {addr} прислал слишком длинную строку, отключаем")
     except ConnectionResetError:
-        pass
+        reason = "reset"
+    except OSError:
+        reason = "error"
     except Exception as e:
+        reason = "error"
         print("Ошибка в обработчике клиента:", e)
     finally:
-        remove_client(conn)
+        remove_client(conn, reason)
         print(f"[-] {addr} отключился")
 
 
@@ -81,6 +340,10 @@ def accept_loop(server_sock: socket.socket):
 
 
 if __name__ == "__main__":
+    threading.Thread(target=fanout_loop, daemon=True).start()
+    if ADMIN_PORT is not None:
+        serve_admin(stats, ADMIN_HOST, ADMIN_PORT)
+        print(f"Метрики: http://{ADMIN_HOST}:{ADMIN_PORT}/metrics")
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_sock:
         server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_sock.bind((HOST, PORT))
@@ -90,3 +353,4 @@ if __name__ == "__main__":
             accept_loop(server_sock)
         except KeyboardInterrupt:
             print("\nСервер остановлен вручную.")
+            print(write_summary())
@@ -0,0 +1,123 @@
+"""Разбор массовой загрузки оценок (POST /api/grades/bulk).
+
+Тело читается кусками по мере прихода и режется на строки без сборки
+целиком. Поддерживаются два формата:
+
+    application/x-ndjson — по JSON-значению на строку: объект
+        {"discipline": ..., "grade": ...} или пара ["дисциплина", "оценка"];
+    text/csv — строки "дисциплина,оценка", первая может быть заголовком
+        discipline,grade.
+
+Пустые строки пропускаются. Если хоть одна запись не разобралась, не
+добавляется ничего: в ответе номер строки с ошибкой.
+"""
+
+import codecs
+import csv
+import json
+
+from common.http_parser import HttpError
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv",)
+CSV_HEADER = ["discipline", "grade"]
+
+
+def iter_lines(chunks):
+    """Строки текста UTF-8 (с "\\n" на конце) из кусков байт тела."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    try:
+        for chunk in chunks:
+            lines = (tail + decoder.decode(chunk)).split("\n")
+            tail = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        tail += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HttpError(400, "Bad Request", "тело не в UTF-8")
+    if tail:
+        yield tail
+
+
+def clean_pair(discipline, grade):
+    """(дисциплина, оценка) из полей формы или JSON; None, если поле пусто.
+
+    null считается пустым полем, оценка может быть числом. Объекты,
+    списки и true/false — ValueError.
+    """
+    discipline = "" if discipline is None else discipline
+    grade = "" if grade is None else grade
+    if (
+        not isinstance(discipline, str)
+        or not isinstance(grade, (str, int, float))
+        or isinstance(grade, bool)
+    ):
+        raise ValueError("неверная запись")
+    grade = str(grade)
+    if not discipline or not grade:
+        return None
+    return discipline, grade
+
+
+def make_pair(discipline, grade, line: int):
+    try:
+        pair = clean_pair(discipline, grade)
+    except ValueError as e:
+        raise HttpError(400, "Bad Request", f"строка {line}: {e}")
+    if pair is None:
+        raise HttpError(400, "Bad Request", f"строка {line}: пустое поле")
+    return pair
+
+
+def parse_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            raise HttpError(400, "Bad Request", f"строка {number}: неверный JSON")
+        if isinstance(value, dict):
+            yield make_pair(value.get("discipline"), value.get("grade"), number)
+        elif isinstance(value, list) and len(value) == 2:
+            yield make_pair(*value, number)
+        else:
+            raise HttpError(400, "Bad Request", f"строка {number}: неверная запись")
+
+
+def parse_csv(lines):
+    rows = csv.reader(lines)
+    try:
+        for row in rows:
+            if not row or row == [""]:
+                continue
+            if rows.line_num == 1 and [f.strip().lower() for f in row] == CSV_HEADER:
+                continue
+            if len(row) != 2:
+                raise HttpError(
+                    400, "Bad Request", f"строка {rows.line_num}: нужно два поля"
+                )
+            yield make_pair(row[0].strip(), row[1].strip(), rows.line_num)
+    except csv.Error as e:
+        raise HttpError(400, "Bad Request", f"строка {rows.line_num}: {e}")
+
+
+def parse_bulk(content_type: str, chunks) -> list:
+    """Все пары (дисциплина, оценка) из тела или HttpError.
+
+    Тело дочитывается до конца даже при ошибке, иначе его остаток
+    приняли бы за следующий запрос.
+    """
+    if content_type in NDJSON_TYPES:
+        parse = parse_ndjson
+    elif content_type in CSV_TYPES:
+        parse = parse_csv
+    else:
+        raise HttpError(415, "Unsupported Media Type")
+    chunks = iter(chunks)
+    try:
+        return list(parse(iter_lines(chunks)))
+    finally:
+        for _ in chunks:
+            pass
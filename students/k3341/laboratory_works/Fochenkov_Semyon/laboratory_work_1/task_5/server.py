@@ -1,16 +1,53 @@
-import socket
+import argparse
+import functools
+import json
+import os
+import sys
 import threading
-from urllib.parse import unquote, parse_qs
+import time
+from collections import OrderedDict
+from html import escape
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import connection, prefork  # noqa: E402
+from common.connection import connection_headers  # noqa: E402
+from common.http_parser import HttpError, parse_int  # noqa: E402
+from bulk import clean_pair, parse_bulk  # noqa: E402
+from storage import BACKENDS, MemoryStorage, open_storage  # noqa: E402
 
 HOST = "127.0.0.1"
 PORT = 8080
+# Число процессов; больше одного — pre-fork (см. common/prefork.py).
+# С хранилищем memory у каждого процесса свой журнал.
+WORKERS = 1
+# Где хранить журнал (см. storage.py) и путь к файлу для log/sqlite.
+STORAGE = "memory"
+DATA_PATH = None
+# Сколько оценок показывать на странице по умолчанию и самое большее.
+PER_PAGE = 100
+MAX_PER_PAGE = 1000
+# Сколько собранных страниц держать в памяти.
+PAGE_CACHE_SIZE = 256
+# Отдавать страницы частями (Transfer-Encoding: chunked) по мере рендеринга,
+# не собирая их целиком (--stream). Тогда и страница может быть больше.
+STREAM = False
+MAX_STREAM_PER_PAGE = 100_000
+# Сколько записей читать из хранилища за раз и от какого размера
+# отправлять накопленный кусок ответа.
+STREAM_BATCH = 500
+CHUNK_SIZE = 16 * 1024
+# Наибольшее тело массовой загрузки (POST /api/grades/bulk); оно читается
+# потоком, а не целиком, как обычные запросы.
+MAX_BULK_BYTES = 256 * 1024 * 1024
+API_GRADES = "/api/grades"
+API_BULK = "/api/grades/bulk"
+# Печатать ли подключения и каждый запрос (--quiet выключает).
+DEBUG = True
+# Куда писать журнал запросов: путь к файлу, "-" — stdout, "" — никуда.
+ACCESS_LOG = "-"
 
-grades = []
-lock = threading.Lock()
-
-
-def build_html():
-    html = """
+PAGE_HEAD = """
     <!DOCTYPE html>
     <html lang="ru">
     <head>
@@ -24,80 +61,348 @@ def build_html():
             <input type="text" name="grade" placeholder="Оценка" required>
             <input type="submit" value="Добавить">
         </form>
+        <form method="GET" action="/">
+            <input type="text" name="discipline" placeholder="Дисциплина"
+                   value="{discipline}">
+            <input type="submit" value="Показать">
+        </form>
         <hr>
     """
+TABLE_HEAD = "<table border='1'><tr><th>Дисциплина</th><th>Оценка</th></tr>"
+TABLE_TAIL = "</table>"
+EMPTY = "<p>Пока нет данных.</p>"
+PAGE_TAIL = "</body></html>"
+
+storage = MemoryStorage()
+lock = threading.Lock()
+# (дисциплина, страница, размер) -> (версия журнала, байты страницы).
+page_cache = OrderedDict()
+
+
+@functools.lru_cache(maxsize=65536)
+def render_row(discipline: str, grade: str) -> str:
+    return f"<tr><td>{escape(discipline)}</td><td>{escape(grade)}</td></tr>"
+
+
+def add_grade(discipline: str, grade: str):
+    storage.add(discipline, grade)
+
+
+def page_link(discipline, page: int, per_page: int) -> str:
+    query = {"page": page}
+    if discipline is not None:
+        query["discipline"] = discipline
+    if per_page != PER_PAGE:
+        query["per_page"] = per_page
+    return escape("/?" + urlencode(query))
+
+
+def render_nav(discipline, page: int, pages: int, per_page: int, total: int) -> str:
+    links = [f"Страница {page} из {pages}, записей: {total}."]
+    if page > 1:
+        links.append(
+            f'<a href="{page_link(discipline, page - 1, per_page)}">← Назад</a>'
+        )
+    if page < pages:
+        links.append(
+            f'<a href="{page_link(discipline, page + 1, per_page)}">Вперёд →</a>'
+        )
+    return "<p>" + " ".join(links) + "</p>"
+
+
+def render_page(discipline: str = None, page: int = 1, per_page: int = PER_PAGE):
+    """Куски HTML одной страницы журнала; page=None — последняя.
+
+    Записи читаются из хранилища пачками по STREAM_BATCH, так что
+    одновременно в памяти не больше одной пачки строк таблицы.
+    """
+    total = storage.count(discipline)
+    pages = max(1, -(-total // per_page))
+    number = pages if page is None else min(page, pages)
+    offset = (number - 1) * per_page
+    end = min(offset + per_page, total)
+    yield PAGE_HEAD.format(discipline=escape(discipline or ""))
+    if offset >= end:
+        yield EMPTY
+    else:
+        yield TABLE_HEAD
+        while offset < end:
+            records = storage.page(discipline, offset, min(STREAM_BATCH, end - offset))
+            if not records:
+                break
+            yield "".join(render_row(d, g) for _, d, g in records)
+            offset += len(records)
+        yield TABLE_TAIL
+        yield render_nav(discipline, number, pages, per_page, total)
+    yield PAGE_TAIL
+
+
+def build_html(
+    discipline: str = None, page: int = 1, per_page: int = PER_PAGE
+) -> bytes:
+    """Одна страница журнала в UTF-8; page=None — последняя.
+
+    Хранилище читается без общей блокировки, строки таблицы рендерятся
+    через кэш render_row и склеиваются одним join. Собранная страница
+    кэшируется, пока в журнал не добавили оценок.
+    """
+    version = storage.count()
+    key = (discipline, page, per_page)
+    with lock:
+        cached = page_cache.get(key)
+        if cached is not None and cached[0] == version:
+            page_cache.move_to_end(key)
+            return cached[1]
+    body = "".join(render_page(discipline, page, per_page)).encode("utf-8")
     with lock:
-        if grades:
-            html += "<table border='1'><tr><th>Дисциплина</th><th>Оценка</th></tr>"
-            for g in grades:
-                html += f"<tr><td>{g['discipline']}</td><td>{g['grade']}</td></tr>"
-            html += "</table>"
-        else:
-            html += "<p>Пока нет данных.</p>"
-
-    html += "</body></html>"
-    return html
-
-
-def handle_request(request_text: str):
-    lines = request_text.split("\r\n")
-    if not lines:
-        return "HTTP/1.1 400 Bad Request\r\n\r\n"
-
-    request_line = lines[0]
-    method, path, _ = request_line.split()
-
-    body = ""
-    if "" in lines:
-        body = "\r\n".join(lines[lines.index("") + 1 :])
-
-    if method == "POST" and path == "/":
-        params = parse_qs(body)
-        discipline = unquote(params.get("discipline", [""])[0])
-        grade = unquote(params.get("grade", [""])[0])
-        if discipline and grade:
-            with lock:
-                grades.append({"discipline": discipline, "grade": grade})
-
-    html = build_html()
-    response = (
-        "HTTP/1.1 200 OK\r\n"
+        page_cache[key] = (version, body)
+        page_cache.move_to_end(key)
+        while len(page_cache) > PAGE_CACHE_SIZE:
+            page_cache.popitem(last=False)
+    return body
+
+
+def encode_chunks(parts):
+    """Собрать куски текста в куски chunked-ответа размером около CHUNK_SIZE.
+
+    Первый кусок (шапка страницы) уходит сразу, чтобы браузер начал
+    отрисовку, не дожидаясь таблицы.
+    """
+    buffer = []
+    size = 0
+    first = True
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if first or size >= CHUNK_SIZE:
+            data = "".join(buffer).encode("utf-8")
+            yield f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+            buffer = []
+            size = 0
+            first = False
+    if buffer:
+        data = "".join(buffer).encode("utf-8")
+        yield f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+    yield b"0\r\n\r\n"
+
+
+def stream_html(discipline: str, page, per_page: int, keep_alive: bool):
+    yield (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/html; charset=utf-8\r\n"
+        b"Transfer-Encoding: chunked\r\n" + connection_headers(keep_alive) + b"\r\n"
+    )
+    yield from encode_chunks(render_page(discipline, page, per_page))
+
+
+def positive_int(value: str, default: int) -> int:
+    number = parse_int(value)
+    return number if number else default
+
+
+def html_response(status: str, html: bytes, keep_alive: bool) -> bytes:
+    head = (
+        f"HTTP/1.1 {status}\r\n"
         "Content-Type: text/html; charset=utf-8\r\n"
-        f"Content-Length: {len(html.encode('utf-8'))}\r\n"
-        "\r\n"
-        f"{html}"
+        f"Content-Length: {len(html)}\r\n"
+    ).encode("utf-8")
+    return head + connection_headers(keep_alive) + b"\r\n" + html
+
+
+def json_response(status: str, value, keep_alive: bool) -> bytes:
+    body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+    ).encode("utf-8")
+    return head + connection_headers(keep_alive) + b"\r\n" + body
+
+
+def error_response(error: HttpError, keep_alive: bool, api: bool = False) -> bytes:
+    status = f"{error.status} {error.reason}"
+    if api:
+        return json_response(
+            status, {"error": error.reason, "detail": error.detail}, keep_alive
+        )
+    html = f"<h1>{error.status} {error.reason}</h1>".encode("utf-8")
+    return html_response(status, html, keep_alive)
+
+
+def api_grades(request):
+    """GET /api/grades: страница журнала в JSON (discipline, page, per_page)."""
+    query = request.query
+    discipline = query.get("discipline") or None
+    page = positive_int(query.get("page", ""), 1)
+    per_page = min(positive_int(query.get("per_page", ""), PER_PAGE), MAX_PER_PAGE)
+    total = storage.count(discipline)
+    records = storage.page(discipline, (page - 1) * per_page, per_page)
+    return {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": max(1, -(-total // per_page)),
+        "items": [{"id": n, "discipline": d, "grade": g} for n, d, g in records],
+    }
+
+
+def api_bulk(request, reader):
+    """POST /api/grades/bulk: NDJSON или CSV (см. bulk.py).
+
+    Тело разбирается по мере прихода, а все оценки добавляются одним
+    add_many: хранилище берёт блокировку (транзакцию, запись в файл)
+    один раз на всю загрузку.
+    """
+    pairs = parse_bulk(request.content_type, reader.iter_body(request, MAX_BULK_BYTES))
+    storage.add_many(pairs)
+    return {"added": len(pairs), "total": storage.count()}
+
+
+def handle_api(request, reader, keep_alive: bool):
+    if request.path == API_GRADES:
+        if request.method != "GET":
+            raise HttpError(405, "Method Not Allowed")
+        value = api_grades(request)
+    elif request.path == API_BULK:
+        if request.method != "POST":
+            raise HttpError(405, "Method Not Allowed")
+        value = api_bulk(request, reader)
+    else:
+        raise HttpError(404, "Not Found")
+    return [json_response("200 OK", value, keep_alive)]
+
+
+def handle_request(request, reader, keep_alive: bool):
+    """Ответ на запрос: список кусков или генератор (в режиме STREAM)."""
+    if request.path.startswith("/api/"):
+        return handle_api(request, reader, keep_alive)
+    if request.method not in ("GET", "POST"):
+        raise HttpError(405, "Method Not Allowed")
+    # HTTP/1.0 не знает chunked: такие клиенты получают страницу целиком.
+    stream = STREAM and request.version == "HTTP/1.1"
+    query = request.query
+    discipline = query.get("discipline") or None
+    page = positive_int(query.get("page", ""), 1)
+    per_page = min(
+        positive_int(query.get("per_page", ""), PER_PAGE),
+        MAX_STREAM_PER_PAGE if stream else MAX_PER_PAGE,
     )
-    return response
 
+    if request.method == "POST" and request.path == "/":
+        # Форма браузера или JSON {"discipline": ..., "grade": ...}.
+        fields = request.data()
+        try:
+            pair = clean_pair(fields.get("discipline"), fields.get("grade"))
+        except ValueError:
+            raise HttpError(400, "Bad Request")
+        if pair is not None:
+            add_grade(*pair)
+        # После добавления показываем последнюю страницу, где новая оценка.
+        discipline, page = None, None
 
-def handle_client(conn, addr):
-    print(f"[+] Подключен клиент {addr}")
+    if stream:
+        return stream_html(discipline, page, per_page, keep_alive)
+    return [html_response("200 OK", build_html(discipline, page, per_page), keep_alive)]
+
+
+def respond(conn, request, reader, keep_alive: bool):
+    """Отправить ответ; возвращает код, число байт и момент начала отправки."""
     try:
-        data = conn.recv(4096).decode("utf-8")
-        if not data:
-            return
-        print(f"[{addr}] {data.splitlines()[0]}")
-        response = handle_request(data)
-        conn.sendall(response.encode("utf-8"))
-    except Exception as e:
-        print(f"Ошибка: {e}")
-    finally:
-        conn.close()
-        print(f"[-] Клиент {addr} отключился")
+        chunks = iter(handle_request(request, reader, keep_alive))
+        # Для потокового ответа "обработка" — время до первого куска.
+        first = next(chunks)
+    except HttpError as e:
+        chunks = iter(())
+        # Если тело так и не прочитано, следующий запрос в сокете не найти.
+        keep_alive = keep_alive and not reader.body_pending
+        first = error_response(e, keep_alive, request.path.startswith("/api/"))
+    sending = time.perf_counter()
+    conn.sendall(first)
+    sent = len(first)
+    for chunk in chunks:
+        conn.sendall(chunk)
+        sent += len(chunk)
+    return int(first[9:12]), sent, sending
+
+
+def read_request(reader):
+    """Очередной запрос с телом; тело массовой загрузки читает api_bulk сам."""
+    request = reader.read_head()
+    if request is not None and not (
+        request.method == "POST" and request.path == API_BULK
+    ):
+        started = time.perf_counter() - request.parse_time
+        request.body = reader.read_body(request)
+        request.parse_time = time.perf_counter() - started
+    return request
+
+
+def handle_client(conn, addr):
+    connection.handle_client(
+        conn, addr, respond, error_response, read_request, debug=DEBUG
+    )
+
+
+def serve(server):
+    connection.serve(server, handle_client)
 
 
 def main():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server.bind((HOST, PORT))
-        server.listen(5)
-        print(f"Сервер работает: http://{HOST}:{PORT}")
-        while True:
-            conn, addr = server.accept()
-            thread = threading.Thread(
-                target=handle_client, args=(conn, addr), daemon=True
-            )
-            thread.start()
+    parser = argparse.ArgumentParser(description="Журнал оценок")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="число процессов")
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="у каждого процесса свой сокет с SO_REUSEPORT",
+    )
+    parser.add_argument("--storage", choices=BACKENDS, default=STORAGE)
+    parser.add_argument(
+        "--data", default=DATA_PATH, help="файл журнала для хранилищ log и sqlite"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="отдавать страницы частями (Transfer-Encoding: chunked)",
+    )
+    parser.add_argument(
+        "--access-log",
+        default=ACCESS_LOG,
+        help='файл журнала запросов, "-" — stdout, "" — не писать',
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="не печатать каждый запрос"
+    )
+    args = parser.parse_args()
+
+    global DEBUG, STREAM, storage
+    DEBUG = not args.quiet
+    STREAM = args.stream
+    storage = open_storage(args.storage, args.data)
+
+    if args.workers > 1:
+        if args.storage == "memory":
+            print("[!] Журнал в памяти: у каждого процесса будет свой список оценок")
+        prefork.run(
+            serve,
+            args.host,
+            args.port,
+            args.workers,
+            args.reuse_port,
+            on_start=functools.partial(connection.open_access_log, args.access_log),
+            on_exit=connection.close_access_log,
+        )
+        return
+    connection.open_access_log(args.access_log)
+    with prefork.make_listener(args.host, args.port, 5) as server:
+        print(f"Сервер работает: http://{args.host}:{args.port}")
+        try:
+            serve(server)
+        except KeyboardInterrupt:
+            print("\nСервер остановлен вручную.")
+        finally:
+            connection.close_access_log()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+"""Хранилища журнала оценок.
+
+У всех одинаковый интерфейс: add / add_many дописывают оценки в конец,
+count и page читают журнал целиком или по одной дисциплине. Запись —
+кортеж (id, дисциплина, оценка), id начинаются с 1 и идут по порядку
+добавления. Оценки только добавляются, поэтому число записей служит
+версией журнала.
+
+    memory — список в памяти процесса, пропадает при перезапуске;
+    log    — файл из JSON-строк, дописываемый в конец, плюс копия в памяти;
+    sqlite — SQLite в режиме WAL.
+
+log и sqlite можно открывать из нескольких процессов (pre-fork): каждый
+видит оценки, добавленные другими.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BACKENDS = ("memory", "log", "sqlite")
+
+
+class MemoryStorage:
+    """Оценки в списке и индекс дисциплина -> номера записей."""
+
+    def __init__(self):
+        self.records = []
+        self.by_discipline = {}
+        self.lock = threading.Lock()
+
+    def append(self, pairs):
+        # Вызывается под self.lock.
+        for discipline, grade in pairs:
+            self.by_discipline.setdefault(discipline, []).append(len(self.records))
+            self.records.append((discipline, grade))
+
+    def add(self, discipline: str, grade: str):
+        self.add_many([(discipline, grade)])
+
+    def add_many(self, pairs):
+        with self.lock:
+            self.append(pairs)
+
+    def count(self, discipline: str = None) -> int:
+        with self.lock:
+            if discipline is None:
+                return len(self.records)
+            return len(self.by_discipline.get(discipline, ()))
+
+    def page(self, discipline: str = None, offset: int = 0, limit: int = 100):
+        with self.lock:
+            if discipline is None:
+                numbers = range(offset, min(offset + limit, len(self.records)))
+            else:
+                numbers = self.by_discipline.get(discipline, [])[
+                    offset : offset + limit
+                ]
+            return [(n + 1, *self.records[n]) for n in numbers]
+
+    def close(self):
+        pass
+
+
+class LogStorage(MemoryStorage):
+    """Журнал в файле: по JSON-строке ["дисциплина", "оценка"] на оценку.
+
+    Файл только дописывается (O_APPEND, одна запись write на пачку), а
+    перед каждым чтением в память догружается то, что дописали другие
+    процессы. Недописанная последняя строка ждёт следующего чтения.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self.offset = 0
+        self.repair()
+        self.refresh()
+
+    def repair(self):
+        """Завершить оборванную последнюю строку (запись прервал сбой).
+
+        Иначе следующая запись приклеится к обрывку и пропадёт вместе с ним;
+        а так обрывок станет отдельной битой строкой, которую decode_lines
+        пропустит.
+        """
+        size = os.fstat(self.fd).st_size
+        if size and os.pread(self.fd, 1, size - 1) != b"\n":
+            os.write(self.fd, b"\n")
+
+    def refresh(self):
+        size = os.fstat(self.fd).st_size
+        if size == self.offset:
+            return
+        with self.lock:
+            if size <= self.offset:
+                return
+            data = os.pread(self.fd, size - self.offset, self.offset)
+            end = data.rfind(b"\n")
+            if end < 0:
+                return
+            self.append(decode_lines(data[:end]))
+            self.offset += end + 1
+
+    def add_many(self, pairs):
+        data = "".join(
+            json.dumps([discipline, grade], ensure_ascii=False) + "\n"
+            for discipline, grade in pairs
+        ).encode("utf-8")
+        if data:
+            os.write(self.fd, data)
+            self.refresh()
+
+    def count(self, discipline: str = None) -> int:
+        self.refresh()
+        return super().count(discipline)
+
+    def page(self, discipline: str = None, offset: int = 0, limit: int = 100):
+        self.refresh()
+        return super().page(discipline, offset, limit)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def decode_lines(data: bytes):
+    for line in data.splitlines():
+        try:
+            discipline, grade = json.loads(line)
+        except (ValueError, TypeError):
+            # Битая строка (например, после сбоя диска) не мешает остальным.
+            continue
+        if isinstance(discipline, str) and isinstance(grade, str):
+            yield discipline, grade
+
+
+class SqliteStorage:
+    """Журнал в SQLite (WAL): читатели не ждут писателей.
+
+    Соединения берутся из пула на время одного запроса к базе. Пул
+    у каждого процесса свой: соединения sqlite3 нельзя передавать через fork.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pool = queue.LifoQueue()
+        self.pid = os.getpid()
+        with sqlite3.connect(path) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS grades (id INTEGER PRIMARY KEY, "
+                "discipline TEXT NOT NULL, grade TEXT NOT NULL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS grades_discipline "
+                "ON grades (discipline, id)"
+            )
+        db.close()
+
+    @contextmanager
+    def connection(self):
+        if self.pid != os.getpid():
+            self.pool = queue.LifoQueue()
+            self.pid = os.getpid()
+        try:
+            db = self.pool.get_nowait()
+        except queue.Empty:
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield db
+        finally:
+            self.pool.put(db)
+
+    def add(self, discipline: str, grade: str):
+        self.add_many([(discipline, grade)])
+
+    def add_many(self, pairs):
+        with self.connection() as db, db:
+            db.executemany(
+                "INSERT INTO grades (discipline, grade) VALUES (?, ?)", pairs
+            )
+
+    def count(self, discipline: str = None) -> int:
+        with self.connection() as db:
+            if discipline is None:
+                # id идут подряд без пропусков: записи не удаляются.
+                (count,) = db.execute("SELECT MAX(id) FROM grades").fetchone()
+                return count or 0
+            (count,) = db.execute(
+                "SELECT COUNT(*) FROM grades WHERE discipline = ?", (discipline,)
+            ).fetchone()
+            return count
+
+    def page(self, discipline: str = None, offset: int = 0, limit: int = 100):
+        with self.connection() as db:
+            if discipline is None:
+                return db.execute(
+                    "SELECT id, discipline, grade FROM grades "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (offset, limit),
+                ).fetchall()
+            return db.execute(
+                "SELECT id, discipline, grade FROM grades WHERE discipline = ? "
+                "ORDER BY id LIMIT ? OFFSET ?",
+                (discipline, limit, offset),
+            ).fetchall()
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def open_storage(backend: str, path: str = None):
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "log":
+        return LogStorage(path or "grades.log")
+    if backend == "sqlite":
+        return SqliteStorage(path or "grades.sqlite3")
+    raise ValueError(f"неизвестное хранилище: {backend}")